@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import grid_mesh
+from src.exporter import save_mesh_as_dxf
+
+MODES = ("3dface", "mesh", "polyface")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare DXF output modes by write time and file size.")
+    parser.add_argument("--grid", type=int, nargs="+", default=[50, 150, 300],
+                        help="grid resolutions; a grid of n yields 2*(n-1)^2 triangles")
+    args = parser.parse_args(argv)
+
+    print(f"{'triangles':>10} {'mode':>9} {'seconds':>9} {'MB':>9} {'tri/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.grid:
+            mesh_data = grid_mesh(n)
+            for mode in MODES:
+                out_path = os.path.join(tmp, f"grid_{n}_{mode}.dxf")
+                start = time.perf_counter()
+                save_mesh_as_dxf(mesh_data, out_path, mode=mode)
+                elapsed = time.perf_counter() - start
+                size_mb = os.path.getsize(out_path) / 1e6
+                print(f"{mesh_data.n_faces:>10} {mode:>9} {elapsed:>9.3f} {size_mb:>9.2f} "
+                      f"{mesh_data.n_faces / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
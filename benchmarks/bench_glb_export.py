@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import grid_mesh, split_parts
+from src.converters import load_mesh_file, write_mesh_file
+
+# (label, output format, write_mesh_file options)
+WRITERS = [
+    ("stl", "stl", {}),
+    ("obj", "obj", {}),
+    ("dxf polyface", "dxf", {"dxf_mode": "polyface"}),
+    ("cmb", "cmb", {}),
+    ("glb float", "glb", {"glb_narrow_indices": False}),
+    ("glb narrow", "glb", {}),
+    ("glb q16", "glb", {"glb_quantize": 16}),
+    ("glb q8", "glb", {"glb_quantize": 8}),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare GLB output (float or quantized positions, 32-bit or narrowed indices) with the "
+                    "other mesh writers by file size, write time and load time.")
+    parser.add_argument("--grid", type=int, nargs="+", default=[100, 300],
+                        help="grid resolutions; a grid of n yields 2*(n-1)^2 triangles")
+    parser.add_argument("--parts", type=int, default=64,
+                        help="parts the grid is split into; smaller parts allow narrower GLB indices")
+    parser.add_argument("--writers", nargs="+", choices=[w[0] for w in WRITERS], metavar="WRITER",
+                        default=[w[0] for w in WRITERS],
+                        help="writers to compare (DXF is read back through ezdxf, which is slow on large grids)")
+    args = parser.parse_args(argv)
+
+    print(f"{'triangles':>10} {'writer':>13} {'MB':>9} {'write s':>9} {'load s':>9} {'tri/s written':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.grid:
+            mesh_data = split_parts(grid_mesh(n), args.parts)
+            for label, out_format, options in WRITERS:
+                if label not in args.writers:
+                    continue
+                out_path = os.path.join(tmp, f"grid_{n}_{label.replace(' ', '_')}.{out_format}")
+                start = time.perf_counter()
+                write_mesh_file(mesh_data, out_path, out_format, **options)
+                written = time.perf_counter() - start
+                start = time.perf_counter()
+                loaded = load_mesh_file(out_path)
+                read = time.perf_counter() - start
+                if loaded.n_faces != mesh_data.n_faces:
+                    raise RuntimeError(f"{label}: read back {loaded.n_faces} of {mesh_data.n_faces} triangles")
+                size_mb = os.path.getsize(out_path) / 1e6
+                print(f"{mesh_data.n_faces:>10} {label:>13} {size_mb:>9.2f} {written:>9.3f} {read:>9.3f} "
+                      f"{mesh_data.n_faces / written:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
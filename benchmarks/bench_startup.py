@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import ensure_fixtures, have_occ
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# top-level packages that must only be imported by the formats that need them
+HEAVY_PACKAGES = {"OCC": {".step"}, "ezdxf": set()}
+
+# Runs in a fresh interpreter: time the imports a CLI merge pays for, run
+# the merge, and list the heavy packages that ended up in sys.modules.
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from src.cli import main
+import src.converters
+imported = time.perf_counter()
+code = main(sys.argv[1:])
+done = time.perf_counter()
+rss = 0
+with open("/proc/self/status") as fh:
+    for line in fh:
+        if line.startswith("VmHWM:"):
+            rss = int(line.split()[1]) / 2 ** 10
+heavy = sorted({m.split(".")[0] for m in sys.modules} & set(json.loads(sys.stdin.read())))
+print(json.dumps({"code": code, "import_s": imported - start, "total_s": done - start,
+                  "peak_rss_mb": rss, "heavy": heavy}))
+"""
+
+
+def run_scenario(inputs, out_path):
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, "merge", *inputs, "-o", out_path],
+        input=json.dumps(sorted(HEAVY_PACKAGES)), capture_output=True, text=True, cwd=REPO_DIR,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time interpreter startup and imports for single-format merges, and check that "
+                    "mesh-only runs never import pythonocc or ezdxf.")
+    parser.add_argument("--size", default="small")
+    args = parser.parse_args(argv)
+
+    paths = ensure_fixtures(args.size)
+    scenarios = [
+        ("stl -> stl", [paths["stl"]], ".stl"),
+        ("obj -> obj", [paths["obj"]], ".obj"),
+        ("stl+obj -> obj", [paths["stl"], paths["obj"]], ".obj"),
+        ("dxf -> stl", [paths["dxf"]], ".stl"),
+    ]
+    if have_occ():
+        scenarios.append(("step -> stl", [paths["step"]], ".stl"))
+
+    failures = []
+    print(f"{'scenario':<16} {'import s':>9} {'total s':>9} {'peak MB':>9}  heavy imports")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, inputs, out_ext in scenarios:
+            result = run_scenario(inputs, os.path.join(tmp, "out" + out_ext))
+            print(f"{name:<16} {result['import_s']:>9.3f} {result['total_s']:>9.3f} "
+                  f"{result['peak_rss_mb']:>9.0f}  {', '.join(result['heavy']) or '-'}")
+            used = {os.path.splitext(p)[1] for p in inputs} | {out_ext}
+            for package in result["heavy"]:
+                if not HEAVY_PACKAGES[package] & used:
+                    failures.append(f"{name}: imported {package}")
+
+    if failures:
+        print("\nUNNEEDED IMPORTS:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    print("no unneeded heavy imports")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
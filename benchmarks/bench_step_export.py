@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import grid_mesh
+from src.stepio import (
+    STEP_MESH_MODES, add_occ_shape_to_xcaf, create_empty_xcaf_doc, mesh_to_occ_shape, save_xcaf_to_step,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare mesh-to-STEP modes by build/write time and file size.")
+    parser.add_argument("--grid", type=int, nargs="+", default=[50, 150],
+                        help="grid resolutions; a grid of n yields 2*(n-1)^2 triangles")
+    parser.add_argument("--modes", nargs="+", choices=STEP_MESH_MODES, default=list(STEP_MESH_MODES))
+    args = parser.parse_args(argv)
+
+    print(f"{'triangles':>10} {'mode':>12} {'build s':>9} {'write s':>9} {'MB':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.grid:
+            mesh_data = grid_mesh(n)
+            timings = {}
+            # per-triangle faces go first so the others can report a speedup
+            for mode in sorted(args.modes, key=lambda m: m != "faces"):
+                out_path = os.path.join(tmp, f"grid_{n}_{mode}.step")
+                start = time.perf_counter()
+                shape = mesh_to_occ_shape(mesh_data, mode)
+                built = time.perf_counter()
+                doc, shape_tool = create_empty_xcaf_doc()
+                add_occ_shape_to_xcaf(doc, shape_tool, shape, label_name="grid")
+                save_xcaf_to_step(doc, out_path, tessellated=mode == "tessellated")
+                written = time.perf_counter()
+                timings[mode] = written - start
+                speedup = timings["faces"] / timings[mode] if "faces" in timings else float("nan")
+                print(f"{mesh_data.n_faces:>10} {mode:>12} {built - start:>9.3f} {written - built:>9.3f} "
+                      f"{os.path.getsize(out_path) / 1e6:>9.2f} {speedup:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cmbio import write_cmb
+from src.dxfio import DxfStreamWriter
+from src.meshdata import MeshData, MeshPart
+from src.objio import write_obj
+from src.stlio import facet_normals, write_stl
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# grid resolution of the mesh fixtures and part count of the STEP assembly
+SIZES = {
+    "small": {"grid": 100, "parts": 8},
+    "medium": {"grid": 400, "parts": 64},
+    "large": {"grid": 1200, "parts": 216},
+}
+
+
+def grid_mesh(n, offset=0.0):
+    xs, ys = np.meshgrid(np.linspace(0, 100, n), np.linspace(0, 100, n))
+    zs = np.sin(xs / 7.0) * np.cos(ys / 11.0) * 5.0
+    vertices = np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()]) + offset
+    idx = np.arange(n * n).reshape(n, n)
+    a, b, c, d = idx[:-1, :-1].ravel(), idx[:-1, 1:].ravel(), idx[1:, 1:].ravel(), idx[1:, :-1].ravel()
+    faces = np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+    return MeshData(vertices, faces, name="grid")
+
+
+def split_parts(mesh_data, n_parts):
+    bounds = np.linspace(0, mesh_data.n_faces, n_parts + 1).astype(int)
+    parts = [MeshPart(f"part{i}", a, b) for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))]
+    return MeshData(mesh_data.vertices, mesh_data.faces, mesh_data.name, parts=parts)
+
+
+def write_ascii_stl(mesh_data, out_path):
+    triangles = mesh_data.triangles().astype(np.float32)
+    rows = np.concatenate([facet_normals(triangles), triangles.reshape(-1, 9)], axis=1)
+    rows_per_write = 1 << 16
+    facet = "facet normal %.7e %.7e %.7e\n outer loop\n" + "  vertex %.7e %.7e %.7e\n" * 3 + " endloop\nendfacet\n"
+    with open(out_path, "w") as fh:
+        fh.write("solid grid\n")
+        for start in range(0, len(rows), rows_per_write):
+            block = rows[start:start + rows_per_write]
+            fh.write((facet * len(block)) % tuple(block.ravel().tolist()))
+        fh.write("endsolid grid\n")
+
+
+def write_step_assembly(n_parts, out_path):
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
+    from OCC.Core.BRepPrimAPI import (
+        BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder, BRepPrimAPI_MakeSphere, BRepPrimAPI_MakeTorus,
+    )
+    from OCC.Core.STEPControl import STEPControl_AsIs, STEPControl_Writer
+    from OCC.Core.TopoDS import TopoDS_Compound
+    from OCC.Core.gp import gp_Trsf, gp_Vec
+
+    makers = [
+        lambda: BRepPrimAPI_MakeBox(8.0, 6.0, 4.0).Shape(),
+        lambda: BRepPrimAPI_MakeCylinder(3.0, 8.0).Shape(),
+        lambda: BRepPrimAPI_MakeSphere(4.0).Shape(),
+        lambda: BRepPrimAPI_MakeTorus(4.0, 1.5).Shape(),
+    ]
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    side = int(np.ceil(n_parts ** (1 / 3)))
+    for i in range(n_parts):
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(12.0 * (i % side), 12.0 * (i // side % side), 12.0 * (i // side ** 2)))
+        builder.Add(compound, BRepBuilderAPI_Transform(makers[i % len(makers)](), trsf, True).Shape())
+    writer = STEPControl_Writer()
+    writer.Transfer(compound, STEPControl_AsIs)
+    writer.Write(out_path)
+
+
+def have_occ():
+    try:
+        import OCC.Core.BRepPrimAPI  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def fixture_paths(size, directory=FIXTURE_DIR):
+    base = os.path.join(directory, size)
+    paths = {
+        "stl": base + ".stl",
+        "stl_ascii": base + "_ascii.stl",
+        "obj": base + ".obj",
+        "dxf": base + ".dxf",
+        "cmb": base + ".cmb",
+    }
+    if have_occ():
+        paths["step"] = base + ".step"
+    return paths
+
+
+def ensure_fixtures(size, directory=FIXTURE_DIR):
+    # Fixtures are deterministic, so existing files are reused.
+    os.makedirs(directory, exist_ok=True)
+    paths = fixture_paths(size, directory)
+    spec = SIZES[size]
+    mesh_data = None
+    for kind, path in paths.items():
+        if os.path.exists(path):
+            continue
+        if kind == "step":
+            write_step_assembly(spec["parts"], path + ".tmp")
+        else:
+            mesh_data = mesh_data or grid_mesh(spec["grid"])
+            if kind == "stl":
+                write_stl(mesh_data, path + ".tmp")
+            elif kind == "stl_ascii":
+                write_ascii_stl(mesh_data, path + ".tmp")
+            elif kind == "obj":
+                write_obj(mesh_data, path + ".tmp")
+            elif kind == "cmb":
+                write_cmb(split_parts(mesh_data, spec["parts"]), path + ".tmp")
+            else:
+                with DxfStreamWriter(path + ".tmp", "3dface") as writer:
+                    writer.write(mesh_data, "grid")
+        os.replace(path + ".tmp", path)
+    return paths
+
@@ -0,0 +1,295 @@
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import FIXTURE_DIR, SIZES, ensure_fixtures, fixture_paths, have_occ
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TIME_TOLERANCE = 0.30
+RSS_TOLERANCE = 0.20
+# slowdowns smaller than this are timer noise on the small fixtures
+MIN_SLOWDOWN_SECONDS = 0.05
+
+
+def _load(kind):
+    def setup(paths):
+        return paths[kind]
+
+    def run(path):
+        if kind == "step":
+            from src.converters import load_step_as_mesh
+
+            mesh_data = load_step_as_mesh(path)
+        elif kind == "obj":
+            from src.objio import read_obj
+
+            mesh_data = read_obj(path)
+        elif kind == "dxf":
+            from src.dxfio import read_dxf
+
+            mesh_data = read_dxf(path)
+        elif kind == "cmb":
+            from src.cmbio import read_cmb
+
+            mesh_data = read_cmb(path)
+        else:
+            from src.stlio import read_stl
+
+            mesh_data = read_stl(path)
+        return mesh_data.n_faces, os.path.getsize(path)
+
+    return setup, run
+
+
+def _cmb_part():
+    # opening the index and touching one part, as a viewer would
+    def setup(paths):
+        return paths["cmb"]
+
+    def run(path):
+        from src.cmbio import CmbFile
+
+        cmb = CmbFile(path)
+        part = cmb.part(len(cmb) // 2)
+        # fault the mapped pages in
+        part.vertices.sum()
+        part.faces.sum()
+        return part.n_faces, part.nbytes
+
+    return setup, run
+
+
+def _merge():
+    def setup(paths):
+        from src.dxfio import read_dxf
+        from src.objio import read_obj
+        from src.stlio import read_stl
+
+        return [read_stl(paths["stl"]), read_obj(paths["obj"]), read_dxf(paths["dxf"])]
+
+    def run(meshes):
+        from src.meshdata import merge_meshes
+
+        merged = merge_meshes(meshes, weld_tolerance=1e-6, drop_duplicates=True)
+        return sum(m.n_faces for m in meshes), sum(m.nbytes for m in meshes) + merged.nbytes
+
+    return setup, run
+
+
+def _decimate(ratio):
+    def setup(paths):
+        from src.stlio import read_stl
+
+        return read_stl(paths["stl"])
+
+    def run(mesh_data):
+        from src.decimate import decimate
+
+        decimate(mesh_data, ratio=ratio)
+        return mesh_data.n_faces, mesh_data.nbytes
+
+    return setup, run
+
+
+def _write(kind, **options):
+    def setup(paths):
+        from src.stlio import read_stl
+
+        return read_stl(paths["stl"]), tempfile.mkdtemp()
+
+    def run(state):
+        mesh_data, out_dir = state
+        out_path = os.path.join(out_dir, "out." + kind)
+        if kind == "step":
+            from src.stepio import add_occ_shape_to_xcaf, create_empty_xcaf_doc, mesh_to_occ_shape
+            from src.stepio import save_xcaf_to_step
+
+            doc, shape_tool = create_empty_xcaf_doc()
+            add_occ_shape_to_xcaf(doc, shape_tool, mesh_to_occ_shape(mesh_data))
+            save_xcaf_to_step(doc, out_path)
+        else:
+            from src import exporter
+
+            getattr(exporter, f"save_mesh_as_{kind}")(mesh_data, out_path, **options)
+        size = os.path.getsize(out_path)
+        os.remove(out_path)
+        return mesh_data.n_faces, size
+
+    return setup, run
+
+
+CASES = {
+    "load_stl": _load("stl"),
+    "load_stl_ascii": _load("stl_ascii"),
+    "load_obj": _load("obj"),
+    "load_dxf": _load("dxf"),
+    "load_cmb": _load("cmb"),
+    "load_cmb_part": _cmb_part(),
+    "load_step": _load("step"),
+    "merge": _merge(),
+    "decimate_10pct": _decimate(0.1),
+    "write_stl": _write("stl"),
+    "write_obj": _write("obj"),
+    "write_dxf_polyface": _write("dxf", mode="polyface"),
+    "write_dxf_mesh": _write("dxf", mode="mesh"),
+    "write_cmb": _write("cmb"),
+    "write_step": _write("step"),
+}
+OCC_CASES = {"load_step", "write_step"}
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec on Linux, so a child forked from a large
+    # parent would report the parent's peak; VmHWM starts afresh.
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def run_child(case, size, repeat):
+    setup, run = CASES[case]
+    state = setup(fixture_paths(size))
+    # an untimed run first pays for lazy imports (ezdxf, OCC) and cold
+    # caches, so the result does not depend on the repeat count
+    run(state)
+    best = None
+    for _ in range(repeat):
+        # as in timeit, the collector is kept out of the timed run, so
+        # garbage from earlier runs is not collected on this one's clock
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            triangles, n_bytes = run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "seconds": round(best, 6),
+        "triangles": triangles,
+        "bytes": n_bytes,
+        "triangles_per_s": round(triangles / best),
+        "mb_per_s": round(n_bytes / 1e6 / best, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_case(case, size, repeat):
+    # a fresh interpreter per case so peak RSS belongs to that case alone
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", case, size, "--repeat", str(repeat)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{size}/{case} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, time_tolerance, rss_tolerance):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        slowdown = result["seconds"] - base["seconds"]
+        if slowdown > base["seconds"] * time_tolerance and slowdown > MIN_SLOWDOWN_SECONDS:
+            regressions.append(f"{key}: {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(f"{key}: peak RSS {result['peak_rss_mb']:.0f} MB "
+                               f"vs baseline {base['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time loaders, the merge stage and writers on synthetic fixtures.")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"])
+    parser.add_argument("--cases", nargs="+", default=["*"], help="case names or glob patterns")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is kept")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline instead of comparing")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE)
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(*args.child, args.repeat)))
+        return 0
+
+    cases = [c for c in CASES if any(fnmatch.fnmatch(c, p) for p in args.cases)]
+    if not have_occ():
+        skipped = [c for c in cases if c in OCC_CASES]
+        cases = [c for c in cases if c not in OCC_CASES]
+        if skipped:
+            print(f"pythonocc not installed, skipping: {', '.join(skipped)}")
+
+    results = {}
+    print(f"{'case':<28} {'seconds':>9} {'tri/s':>12} {'MB/s':>9} {'peak MB':>9}")
+    for size in args.sizes:
+        print(f"generating {size} fixtures in {FIXTURE_DIR}", file=sys.stderr)
+        ensure_fixtures(size)
+        for case in cases:
+            key = f"{size}/{case}"
+            result = results[key] = run_case(case, size, args.repeat)
+            print(f"{key:<28} {result['seconds']:>9.3f} {result['triangles_per_s']:>12} "
+                  f"{result['mb_per_s']:>9.1f} {result['peak_rss_mb']:>9.0f}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"machine": machine_info(), "results": results}, fh, indent=2)
+
+    if args.save_baseline:
+        baseline = {"machine": machine_info(), "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fh:
+                baseline["results"] = json.load(fh).get("results", {})
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get("machine") != machine_info():
+        print(f"warning: baseline was recorded on {baseline.get('machine')}, timings may not be comparable")
+    regressions = compare(results, baseline, args.time_tolerance, args.rss_tolerance)
+    if regressions:
+        print(f"\nPERFORMANCE REGRESSION ({len(regressions)}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from .meshdata import MeshData, MeshPart
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 2: part tables of multi-part inputs are kept
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cadconverter")
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+
+def file_digest(fpath, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(fpath, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MeshCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, mmap=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self._entries_root, exist_ok=True)
+
+    @property
+    def _stats_path(self):
+        return os.path.join(self.directory, "stats.json")
+
+    @property
+    def _entries_root(self):
+        return os.path.join(self.directory, "entries")
+
+    def _entry_dir(self, key):
+        return os.path.join(self._entries_root, key[:2], key)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, "cache.lock"), "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def key(self, fpath, params):
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "digest": file_digest(fpath), "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        entry = self._entry_dir(key)
+        mmap_mode = "r" if self.mmap else None
+        try:
+            vertices = np.load(os.path.join(entry, "vertices.npy"), mmap_mode=mmap_mode)
+            faces = np.load(os.path.join(entry, "faces.npy"), mmap_mode=mmap_mode)
+            os.utime(os.path.join(entry, "faces.npy"))
+        except (FileNotFoundError, ValueError):
+            return None
+        parts = None
+        try:
+            with open(os.path.join(entry, "parts.json")) as fh:
+                parts = [MeshPart(*p) for p in json.load(fh)]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            return None
+        return MeshData(vertices, faces, parts=parts)
+
+    def put(self, key, mesh_data):
+        entry = self._entry_dir(key)
+        if os.path.isdir(entry):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        staging = os.path.join(self._entries_root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            np.save(os.path.join(staging, "vertices.npy"), mesh_data.vertices)
+            np.save(os.path.join(staging, "faces.npy"), mesh_data.faces)
+            if mesh_data.parts:
+                with open(os.path.join(staging, "parts.json"), "w") as fh:
+                    json.dump([list(p) for p in mesh_data.parts], fh)
+            # Publishing by rename keeps half-written entries invisible to
+            # other processes; losing a race to an identical entry is fine.
+            os.rename(staging, entry)
+        except OSError:
+            pass
+        finally:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def _read_totals(self):
+        try:
+            with open(self._stats_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _record(self, **counts):
+        with self._locked():
+            totals = self._read_totals()
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            with open(self._stats_path, "w") as fh:
+                json.dump(totals, fh)
+
+    def get_or_load(self, fpath, load, params):
+        key = self.key(fpath, params)
+        mesh_data = self.get(key)
+        if mesh_data is None:
+            self.misses += 1
+            self._record(misses=1)
+            mesh_data = load(fpath)
+            self.put(key, mesh_data)
+        else:
+            self.hits += 1
+            self._record(hits=1)
+        mesh_data.name = os.path.basename(fpath)
+        return mesh_data
+
+    def _scan(self):
+        entries = []
+        for shard in os.listdir(self._entries_root):
+            shard_dir = os.path.join(self._entries_root, shard)
+            if shard.startswith(".tmp-") or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry = os.path.join(shard_dir, key)
+                try:
+                    size = sum(e.stat().st_size for e in os.scandir(entry))
+                    last_used = os.stat(os.path.join(entry, "faces.npy")).st_mtime
+                except OSError:
+                    continue
+                entries.append((last_used, size, entry))
+        return entries
+
+    def evict(self):
+        evicted = 0
+        with self._locked():
+            entries = sorted(self._scan())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                evicted += 1
+        if evicted:
+            self.evictions += evicted
+            self._record(evictions=evicted)
+
+    def clear(self):
+        with self._locked():
+            for _, _, entry in self._scan():
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def stats(self):
+        entries = self._scan()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "totals": self._read_totals(),
+        }
@@ -0,0 +1,412 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+if __package__:
+    from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, MeshCache
+    from .daemon import DEFAULT_SOCKET
+    from .incremental import default_state_dir
+    from .instrument import Cancelled, Instrumentation, ListSink, open_sink, stage
+else:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, MeshCache
+    from src.daemon import DEFAULT_SOCKET
+    from src.incremental import default_state_dir
+    from src.instrument import Cancelled, Instrumentation, ListSink, open_sink, stage
+
+OUTPUT_FORMATS = ("step", "stl", "obj", "dxf", "cmb", "glb")
+
+
+def output_format_for(out_path, out_format=None):
+    out_format = (out_format or os.path.splitext(out_path)[1].lstrip(".")).lower()
+    if out_format == "stp":
+        out_format = "step"
+    if out_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {out_format or out_path}")
+    return out_format
+
+
+def run_merge(inputs, output, out_format=None, workers=1, linear_deflection=0.1,
+              angular_deflection=0.5, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+              dxf_mode="3dface", step_mesh_mode="shell", weld_tolerance=None, drop_degenerate=False,
+              drop_duplicates=False, stream=False, chunk_mb=None, decimate_ratio=None, max_error=None,
+              lods=(), step_select=None, incremental=None, instances=False, glb_quantize=None,
+              glb_narrow_indices=True):
+    if __package__:
+        from .converters import merge_files_to_mesh, merge_files_to_step
+    else:
+        from src.converters import merge_files_to_mesh, merge_files_to_step
+
+    out_format = output_format_for(output, out_format)
+    cache = MeshCache(cache_dir, cache_max_bytes) if cache_dir else None
+    if incremental is True:
+        incremental = default_state_dir(output)
+    if out_format == "step":
+        return merge_files_to_step(inputs, output, workers=workers, cache=cache, step_mesh_mode=step_mesh_mode,
+                                   step_select=step_select, incremental=incremental, instances=instances)
+    return merge_files_to_mesh(
+        inputs, output, out_format, workers=workers,
+        linear_deflection=linear_deflection, angular_deflection=angular_deflection, cache=cache,
+        dxf_mode=dxf_mode, weld_tolerance=weld_tolerance,
+        drop_degenerate=drop_degenerate, drop_duplicates=drop_duplicates,
+        stream=stream, chunk_bytes=int(chunk_mb * 2 ** 20) if chunk_mb else None,
+        decimate_ratio=decimate_ratio, max_error=max_error, lods=lods, step_select=step_select,
+        incremental=incremental, instances=instances, glb_quantize=glb_quantize,
+        glb_narrow_indices=glb_narrow_indices,
+    )
+
+
+def job_instrumentation(job, name, sinks=(), cancel=None, reset_peak=False):
+    # Records are collected in the job's process and written by the caller,
+    # so concurrent batch jobs never share a sink.
+    if not job.get("metrics") and not job.get("profile") and not sinks and cancel is None:
+        return None
+    collected = [ListSink()] if job.get("metrics") else []
+    return Instrumentation(collected + list(sinks), job=name, profile_path=job.get("profile"), cancel=cancel,
+                           reset_peak=reset_peak)
+
+
+def run_job(job, sinks=(), cancel=None, reset_peak=False):
+    # cancel is an event checked at the start of every stage; reset_peak is
+    # only safe when this job is the only one the process will ever run
+    start = time.perf_counter()
+    summary = {"name": job.get("name", job["output"]), "output": job["output"], "inputs": len(job["inputs"])}
+    instrumentation = job_instrumentation(job, summary["name"], sinks, cancel, reset_peak)
+    try:
+        with instrumentation.activate() if instrumentation else nullcontext():
+            with stage("job", inputs=len(job["inputs"])):
+                failures = run_merge(
+                    job["inputs"], job["output"],
+                    out_format=job.get("format"),
+                    workers=job.get("workers", 1),
+                    linear_deflection=job.get("linear_deflection", 0.1),
+                    angular_deflection=job.get("angular_deflection", 0.5),
+                    cache_dir=job.get("cache_dir"),
+                    cache_max_bytes=job.get("cache_max_bytes", DEFAULT_MAX_BYTES),
+                    dxf_mode=job.get("dxf_mode", "3dface"),
+                    step_mesh_mode=job.get("step_mesh_mode", "shell"),
+                    weld_tolerance=job.get("weld_tolerance"),
+                    drop_degenerate=job.get("drop_degenerate", False),
+                    drop_duplicates=job.get("drop_duplicates", False),
+                    stream=job.get("stream", False),
+                    chunk_mb=job.get("chunk_mb"),
+                    decimate_ratio=job.get("decimate"),
+                    max_error=job.get("max_error"),
+                    lods=job.get("lod") or (),
+                    step_select=job.get("step_select"),
+                    incremental=job.get("incremental"),
+                    instances=job.get("instances", False),
+                    glb_quantize=job.get("glb_quantize"),
+                    glb_narrow_indices=job.get("glb_narrow_indices", True),
+                )
+    except Cancelled:
+        summary.update(status="cancelled", failures=[])
+    except Exception as ex:
+        summary.update(status="failed", error=f"{type(ex).__name__}: {ex}", failures=[])
+    else:
+        summary.update(
+            status="partial" if failures else "ok",
+            failures=[{"path": path, "error": error} for path, error in failures],
+        )
+    summary["seconds"] = round(time.perf_counter() - start, 6)
+    if instrumentation is not None:
+        instrumentation.close()
+        if job.get("metrics"):
+            summary["stages"] = instrumentation.sinks[0].records
+    return summary
+
+
+def write_metrics(path, results):
+    sink = open_sink(path)
+    try:
+        for result in results:
+            for record in result.pop("stages", []):
+                sink.emit(record)
+    finally:
+        sink.close()
+
+
+def load_manifest(manifest_path, defaults):
+    with open(manifest_path) as fh:
+        manifest = json.load(fh)
+    jobs = manifest["jobs"] if isinstance(manifest, dict) else manifest
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    resolved = []
+    for job in jobs:
+        job = {**defaults, **job}
+        job["inputs"] = [os.path.join(base_dir, p) for p in job["inputs"]]
+        job["output"] = os.path.join(base_dir, job["output"])
+        if job.get("profile"):
+            job["profile"] = os.path.join(base_dir, job["profile"])
+        if isinstance(job.get("incremental"), str):
+            job["incremental"] = os.path.join(base_dir, job["incremental"])
+        resolved.append(job)
+    return resolved
+
+
+def run_batch(jobs, max_jobs=None):
+    start = time.perf_counter()
+    if not jobs:
+        results = []
+    elif max_jobs == 1:
+        results = [run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_jobs) as pool:
+            results = list(pool.map(run_job, jobs))
+    return {
+        "jobs": results,
+        "succeeded": sum(r["status"] == "ok" for r in results),
+        "partial": sum(r["status"] == "partial" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+
+
+def add_load_arguments(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to load input files (default: 1)")
+    parser.add_argument("--deflection", dest="linear_deflection", type=float, default=0.1,
+                        help="linear deflection for STEP tessellation")
+    parser.add_argument("--angular-deflection", type=float, default=0.5,
+                        help="angular deflection in radians for STEP tessellation")
+    parser.add_argument("--cache-dir", nargs="?", const=DEFAULT_CACHE_DIR,
+                        help=f"reuse loaded meshes from an on-disk cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument("--dxf-mode", choices=("3dface", "mesh", "polyface"), default="3dface",
+                        help="DXF output entities: one 3DFACE per triangle, one MESH per part, "
+                             "or streamed R12 POLYFACE meshes")
+    parser.add_argument("--glb-quantize", type=int, choices=(8, 16), default=None, metavar="BITS",
+                        help="store GLB positions as 8- or 16-bit integers over each part's bounding box "
+                             "(KHR_mesh_quantization) instead of 32-bit floats")
+    parser.add_argument("--glb-wide-indices", dest="glb_narrow_indices", action="store_false",
+                        help="always write 32-bit GLB indices instead of the narrowest type each part allows")
+    parser.add_argument("--step-mesh", dest="step_mesh_mode", choices=("shell", "tessellated", "faces"),
+                        default="shell",
+                        help="how mesh inputs are written to STEP: a connected shell of planar faces, "
+                             "one AP242 tessellated face, or unconnected faces")
+    parser.add_argument("--step-select", nargs="+", default=None, metavar="PATTERN",
+                        help="transfer only the STEP products or subassemblies whose name, id or "
+                             "path (Assembly/Sub/Part) matches one of these patterns; each is placed "
+                             "where the assembly puts it")
+    parser.add_argument("--instances", action="store_true",
+                        help="store repeated parts once and place them as instances in STEP (assembly "
+                             "components), DXF (blocks) and CMB output; other formats are written expanded")
+    parser.add_argument("--weld-tolerance", type=float, default=None,
+                        help="weld vertices of the merged mesh closer than this, across input files "
+                             "(0 welds exact duplicates only)")
+    parser.add_argument("--drop-degenerate", action="store_true",
+                        help="drop merged faces with repeated vertices or zero area")
+    parser.add_argument("--drop-duplicates", action="store_true",
+                        help="drop merged faces that repeat the vertices of an earlier face")
+    parser.add_argument("--stream", action="store_true",
+                        help="convert mesh outputs chunk by chunk with bounded memory, one input at a time")
+    parser.add_argument("--chunk-mb", type=float, default=None,
+                        help="input read size per chunk in --stream mode (default: 32)")
+    parser.add_argument("--decimate", type=float, default=None, metavar="RATIO",
+                        help="simplify each merged part to this fraction of its triangles")
+    parser.add_argument("--max-error", type=float, default=None,
+                        help="simplify until vertices would move further than this distance")
+    parser.add_argument("--lod", type=float, nargs="+", default=None, metavar="RATIO",
+                        help="also write simplified copies at these fractions as <output>_lod1, _lod2, ...")
+    parser.add_argument("--incremental", nargs="?", const=True, default=None, metavar="DIR",
+                        help="keep each input's loaded mesh and a manifest of input fingerprints in DIR "
+                             "(default: <output>.incremental; always the default in batch mode unless a job "
+                             "sets \"incremental\") and reload only inputs changed since the last run")
+    parser.add_argument("--metrics",
+                        help="record per-stage timings, counts and memory: appended as JSON lines, "
+                             "or as a Prometheus text-format snapshot replaced on each run for *.prom")
+
+
+def add_merge_arguments(parser):
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS,
+                        help="output format (default: from the output extension)")
+    parser.add_argument("--profile", help="write cProfile statistics for the merge to this file")
+    add_load_arguments(parser)
+
+
+def add_daemon_arguments(parser):
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--port", type=int, default=None, help="use TCP on this port instead of the Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src", description="Merge and convert STL, OBJ, DXF, CMB and STEP files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge = commands.add_parser("merge", help="merge input files into one output file")
+    add_merge_arguments(merge)
+
+    batch = commands.add_parser("batch", help="run the merge jobs listed in a JSON manifest")
+    batch.add_argument("manifest")
+    batch.add_argument("-j", "--jobs", type=int, default=None,
+                       help="merge jobs run concurrently (default: CPU count)")
+    batch.add_argument("--summary", help="write the JSON summary here instead of stdout")
+    add_load_arguments(batch)
+
+    serve = commands.add_parser("serve", help="run a resident conversion daemon with warm worker processes")
+    serve.add_argument("--workers", type=int, default=None,
+                       help="worker processes, each running one merge at a time (default: CPU count)")
+    serve.add_argument("--no-preload-step", dest="preload_step", action="store_false",
+                       help="do not import pythonOCC in the workers until a STEP job needs it")
+    add_daemon_arguments(serve)
+
+    submit = commands.add_parser("submit", help="run a merge on a running daemon and show its progress")
+    add_merge_arguments(submit)
+    submit.add_argument("--priority", type=int, default=0, help="higher priorities run first (default: 0)")
+    submit.add_argument("--detach", action="store_true", help="print the job id and return once queued")
+    add_daemon_arguments(submit)
+
+    tree = commands.add_parser("tree", help="list the product structure of a STEP file without loading it")
+    tree.add_argument("step")
+    tree.add_argument("--select", nargs="+", metavar="PATTERN",
+                      help="only list the products --step-select would transfer")
+    tree.add_argument("--json", action="store_true", help="print the index as JSON")
+    return parser
+
+
+def show_tree(args):
+    if __package__:
+        from .stepindex import format_product_tree, select_products, step_index
+    else:
+        from src.stepindex import format_product_tree, select_products, step_index
+
+    index = step_index(args.step)
+    if args.select:
+        products = select_products(index, args.select)
+        text = json.dumps(products, indent=2) if args.json else "\n".join(
+            f"{p['name']} ({p['occurrence']})  #{p['id']}" if p["occurrence"] and p["occurrence"] != p["name"]
+            else f"{p['name']}  #{p['id']}" for p in products
+        )
+    else:
+        text = json.dumps(index, indent=2) if args.json else format_product_tree(index)
+    if text:
+        print(text)
+    return 0
+
+
+def merge_job(args):
+    return {
+        "inputs": args.inputs, "output": args.output, "format": args.format,
+        "workers": args.workers,
+        "linear_deflection": args.linear_deflection,
+        "angular_deflection": args.angular_deflection,
+        "cache_dir": args.cache_dir, "cache_max_bytes": args.cache_max_bytes,
+        "dxf_mode": args.dxf_mode, "step_mesh_mode": args.step_mesh_mode,
+        "step_select": args.step_select, "weld_tolerance": args.weld_tolerance,
+        "drop_degenerate": args.drop_degenerate, "drop_duplicates": args.drop_duplicates,
+        "stream": args.stream, "chunk_mb": args.chunk_mb,
+        "metrics": args.metrics, "profile": args.profile, "incremental": args.incremental,
+        "decimate": args.decimate, "max_error": args.max_error, "lod": args.lod,
+        "instances": args.instances,
+        "glb_quantize": args.glb_quantize, "glb_narrow_indices": args.glb_narrow_indices,
+    }
+
+
+def report_result(args, result):
+    if args.metrics:
+        write_metrics(args.metrics, [result])
+    if result["status"] == "failed":
+        print(f"Error: {result['error']}", file=sys.stderr)
+        return 1
+    print(f"Saved {args.output} in {result['seconds']:.2f}s")
+    return 0 if result["status"] == "ok" else 2
+
+
+def submit_job(args):
+    if __package__:
+        from .daemon import request
+    else:
+        from src.daemon import request
+
+    # the daemon resolves paths from its own working directory
+    job = merge_job(args)
+    job["inputs"] = [os.path.abspath(p) for p in job["inputs"]]
+    for key in ("output", "profile", "cache_dir"):
+        if job.get(key):
+            job[key] = os.path.abspath(job[key])
+    if isinstance(job["incremental"], str):
+        job["incremental"] = os.path.abspath(job["incremental"])
+
+    def show(event):
+        if event["event"] == "queued":
+            print(f"queued as {event['id']} at position {event['position']}")
+        elif event["event"] == "started":
+            print(f"started after {event['queued_s']:.2f}s in the queue")
+        elif event["event"] == "stage":
+            record = event["record"]
+            print(f"[{event['inputs_done']}/{len(job['inputs'])}] {record['stage']} "
+                  f"{record.get('file', '')} {record['wall_s']:.3f}s")
+
+    message = {"op": "submit", "job": job, "priority": args.priority, "follow": not args.detach}
+    try:
+        reply = request(message, args.socket, args.host, args.port, on_event=None if args.detach else show)
+    except OSError as ex:
+        print(f"Error: cannot reach the daemon: {ex}", file=sys.stderr)
+        return 1
+    if "error" in reply:
+        print(f"Error: {reply['error']}", file=sys.stderr)
+        return 1
+    if args.detach:
+        print(reply["id"])
+        return 0
+    if reply["state"] == "cancelled":
+        print("Error: job was cancelled", file=sys.stderr)
+        return 1
+    return report_result(args, reply["result"])
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "tree":
+        return show_tree(args)
+    if args.command == "serve":
+        if __package__:
+            from .daemon import serve
+        else:
+            from src.daemon import serve
+        serve(args.workers, args.socket, args.host, args.port, args.preload_step)
+        return 0
+    if args.command == "submit":
+        return submit_job(args)
+
+    if args.command == "merge":
+        return report_result(args, run_job(merge_job(args), reset_peak=True))
+
+    defaults = {
+        "workers": args.workers,
+        "linear_deflection": args.linear_deflection,
+        "angular_deflection": args.angular_deflection,
+        "cache_dir": args.cache_dir, "cache_max_bytes": args.cache_max_bytes,
+        "dxf_mode": args.dxf_mode, "step_mesh_mode": args.step_mesh_mode,
+        "step_select": args.step_select, "weld_tolerance": args.weld_tolerance,
+        "drop_degenerate": args.drop_degenerate, "drop_duplicates": args.drop_duplicates,
+        "stream": args.stream, "chunk_mb": args.chunk_mb,
+        "metrics": args.metrics, "incremental": True if args.incremental else None,
+        "decimate": args.decimate, "max_error": args.max_error, "lod": args.lod,
+        "instances": args.instances,
+        "glb_quantize": args.glb_quantize, "glb_narrow_indices": args.glb_narrow_indices,
+    }
+    summary = run_batch(load_manifest(args.manifest, defaults), args.jobs)
+    if args.metrics:
+        write_metrics(args.metrics, summary["jobs"])
+    text = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if summary["failed"]:
+        return 1
+    return 2 if summary["partial"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
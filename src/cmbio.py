@@ -0,0 +1,169 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from .instances import Instance, place_instance
+from .meshdata import MeshData, concatenate_meshes
+
+# A .cmb file is a 32-byte header, the raw little-endian vertex and face
+# arrays of every part (each 64-byte aligned so it can be memory-mapped),
+# and a JSON index at the end describing the parts. Version 2 adds an
+# optional instance table placing stored parts by translation; files
+# without instances are still written as version 1.
+CMB_MAGIC = b"CMB\x00"
+CMB_VERSION = 2
+CMB_HEADER = struct.Struct("<4sIQQQ")  # magic, version, index offset, index length, reserved
+CMB_ALIGN = 64
+
+
+class CmbStreamWriter:
+    # Parts are appended as they come; the index and header are written on
+    # close, so a file can be produced part by part in bounded memory.
+    def __init__(self, out_path):
+        self.fh = open(out_path, "wb")
+        self.parts = []
+        self.instances = []
+        self.n_faces = 0
+        self.fh.write(bytes(CMB_HEADER.size))
+
+    def _write_array(self, array):
+        self.fh.write(bytes(-self.fh.tell() % CMB_ALIGN))
+        offset = self.fh.tell()
+        np.ascontiguousarray(array).tofile(self.fh)
+        return offset
+
+    def write(self, mesh_data, name=None):
+        vertices = mesh_data.vertices.astype(mesh_data.vertices.dtype.newbyteorder("<"), copy=False)
+        faces = mesh_data.faces.astype("<i4", copy=False)
+        bounds = mesh_data.bounds().astype(np.float64)
+        self.parts.append({
+            "name": name if name is not None else mesh_data.name,
+            "vertex_dtype": vertices.dtype.str,
+            "n_vertices": len(vertices),
+            "vertex_offset": self._write_array(vertices),
+            "n_faces": len(faces),
+            "face_offset": self._write_array(faces),
+            "bounds": bounds.tolist(),
+        })
+        self.n_faces += len(faces)
+
+    def add_instance(self, part, name, translation):
+        self.instances.append({"part": part, "name": name, "translation": np.asarray(translation).tolist()})
+
+    def close(self):
+        version = 2 if self.instances else 1
+        index = {"version": version, "parts": self.parts}
+        if self.instances:
+            index["instances"] = self.instances
+        index = json.dumps(index).encode("utf-8")
+        index_offset = self.fh.tell()
+        self.fh.write(index)
+        self.fh.seek(0)
+        self.fh.write(CMB_HEADER.pack(CMB_MAGIC, version, index_offset, len(index), 0))
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_cmb(mesh_data, out_path):
+    with CmbStreamWriter(out_path) as writer:
+        for part in mesh_data.iter_parts():
+            writer.write(part, part.name)
+
+
+def write_cmb_instances(prototypes, instances, out_path):
+    # each prototype's arrays are stored once
+    with CmbStreamWriter(out_path) as writer:
+        for prototype in prototypes:
+            writer.write(prototype)
+        for instance in instances:
+            writer.add_instance(instance.prototype, instance.name, instance.translation)
+
+
+class CmbFile:
+    # Opening reads only the header and the index; part arrays are
+    # memory-mapped when a part is asked for.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            header = fh.read(CMB_HEADER.size)
+            if len(header) < CMB_HEADER.size:
+                raise ValueError(f"Not a CMB file: {path}")
+            magic, version, index_offset, index_length, _ = CMB_HEADER.unpack(header)
+            if magic != CMB_MAGIC:
+                raise ValueError(f"Not a CMB file: {path}")
+            if version > CMB_VERSION:
+                raise ValueError(f"Unsupported CMB version {version}: {path}")
+            fh.seek(index_offset)
+            self.index = json.loads(fh.read(index_length))
+        self.parts = self.index["parts"]
+        self.instances = [
+            Instance(i["part"], i["name"], np.array(i["translation"])) for i in self.index.get("instances", [])
+        ]
+
+    def __len__(self):
+        return len(self.parts)
+
+    @property
+    def names(self):
+        return [p["name"] for p in self.parts]
+
+    def bounds(self, key):
+        return np.array(self._entry(key)["bounds"])
+
+    def _entry(self, key):
+        if isinstance(key, str):
+            for entry in self.parts:
+                if entry["name"] == key:
+                    return entry
+            raise KeyError(key)
+        return self.parts[key]
+
+    def _map(self, dtype, offset, rows):
+        if rows == 0:
+            return np.empty((0, 3), dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(rows, 3))
+
+    def part(self, key):
+        entry = self._entry(key)
+        vertices = self._map(entry["vertex_dtype"], entry["vertex_offset"], entry["n_vertices"])
+        faces = self._map("<i4", entry["face_offset"], entry["n_faces"])
+        return MeshData(vertices, faces, entry["name"])
+
+    def iter_parts(self):
+        for i in range(len(self.parts)):
+            yield self.part(i)
+
+    def iter_placed(self):
+        # the file's geometry as placed: the instances when there are any
+        if not self.instances:
+            yield from self.iter_parts()
+            return
+        for instance in self.instances:
+            yield place_instance(self.part(instance.prototype), instance.translation, instance.name)
+
+    def parts_in_box(self, lo, hi):
+        # indices of the non-empty parts whose bounding box meets lo..hi
+        lo, hi = np.asarray(lo), np.asarray(hi)
+        return [
+            i for i, entry in enumerate(self.parts)
+            if entry["n_faces"] and np.all(np.asarray(entry["bounds"][0]) <= hi)
+            and np.all(np.asarray(entry["bounds"][1]) >= lo)
+        ]
+
+
+def read_cmb(cmb_path, parts=None):
+    cmb = CmbFile(cmb_path)
+    meshes = cmb.iter_placed() if parts is None else (cmb.part(key) for key in parts)
+    return concatenate_meshes(meshes, name=os.path.basename(cmb_path))
+
+
+def iter_cmb_chunks(cmb_path, chunk_bytes=None):
+    # one chunk per placed part; each is mapped, not read, until it is used
+    yield from CmbFile(cmb_path).iter_placed()
@@ -1,488 +1,386 @@
 import os
-import numpy as np
-import trimesh
-from stl import mesh
-import ezdxf
-
-from OCC.Core.XCAFApp import XCAFApp_Application
-from OCC.Core.XCAFDoc import XCAFDoc_DocumentTool
-from OCC.Core.TCollection import TCollection_ExtendedString
-from OCC.Core.STEPCAFControl import STEPCAFControl_Reader, STEPCAFControl_Writer
-from OCC.Core.IFSelect import IFSelect_RetDone
-from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
-from OCC.Core.BRep import BRep_Tool
-from OCC.Core.TopExp import TopExp_Explorer
-from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Face
-from OCC.Core.TopAbs import TopAbs_FACE
-from OCC.Core.gp import gp_Pnt
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakePolygon
-from OCC.Core.BRep import BRep_Builder
-from OCC.Core.STEPControl import STEPControl_Reader
-from .exporter import save_mesh_as_stl, save_mesh_as_obj, save_mesh_as_dxf
-
-
-def create_empty_xcaf_doc():
-    app = XCAFApp_Application.GetApplication()
-    fmt = TCollection_ExtendedString("BinXCAF")
-    doc_handle = app.NewDocument(fmt)
-    doc = doc_handle.get()
-    shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())
-    return doc, shape_tool
-
-
-def load_step_xcaf(filepath):
-    doc, shape_tool = create_empty_xcaf_doc()
-    reader = STEPCAFControl_Reader()
-    status = reader.ReadFile(filepath)
-    if status == IFSelect_RetDone:
-        reader.Transfer(doc.GetHandle())
-    else:
-        print(f"Failed to read STEP: {filepath}")
-    return doc, shape_tool
-
 
-def merge_xcaf_docs_into(target_doc, target_shape_tool, source_doc):
-    source_shape_tool = XCAFDoc_DocumentTool.ShapeTool(source_doc.Main())
-    it = source_shape_tool.NewIterator()
-    while it.More():
-        source_label = it.Value()
-        source_shape_tool.CopyShape(source_label, target_shape_tool)
-        it.Next()
+from .decimate import decimate_parts
+from .exporter import (
+    save_mesh_as_stl, save_mesh_as_obj, save_mesh_as_dxf, save_mesh_as_cmb, save_mesh_as_glb,
+    save_instances_as_cmb, save_instances_as_dxf, save_instances_as_glb,
+)
+from .incremental import IncrementalState
+from .instances import duplicate_sources, find_instances
+from .instrument import stage
+from .meshdata import MeshData, degenerate_faces, merge_meshes, select_faces
+from .objio import read_obj
+from .stlio import read_stl
+from .dxfio import read_dxf
+from .cmbio import read_cmb
+from .glbio import read_glb
+from .parallel import load_files_parallel, resolve_workers
+from .stream import stream_files_to_mesh
+
+# pythonocc takes seconds and hundreds of MB to import, so the STEP backend
+# in stepio is only imported by the first call that needs it. Its names
+# are still reachable as attributes of this module.
+STEP_NAMES = (
+    "create_empty_xcaf_doc", "transfer_step_products", "load_step_xcaf", "merge_xcaf_docs_into",
+    "save_xcaf_to_step", "STEP_MESH_MODES", "mesh_to_triangulation", "mesh_to_occ_shell",
+    "mesh_to_occ_tessellated", "mesh_to_occ_shape", "add_occ_shape_to_xcaf", "add_occ_instances_to_xcaf",
+    "triangulation_to_mesh", "tessellate_step_shape", "xcaf_doc_shape",
+)
+
+
+def __getattr__(name):
+    if name in STEP_NAMES:
+        from . import stepio
+
+        return getattr(stepio, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_stl_as_mesh(stl_path, weld=True):
+    return read_stl(stl_path, weld)
 
 
-def save_xcaf_to_step(doc, out_path):
-    writer = STEPCAFControl_Writer()
-    writer.Transfer(doc.GetHandle())
-    writer.Write(out_path)
+def load_obj_as_mesh(obj_path):
+    return read_obj(obj_path)
 
 
-def load_stl_as_mesh(stl_path):
-    stl_mesh = mesh.Mesh.from_file(stl_path)
-    raw_verts = stl_mesh.vectors.reshape(-1, 3)
-    unique_verts, inv = np.unique(raw_verts, axis=0, return_inverse=True)
-    faces = inv.reshape(-1, 3).tolist()
-    vertices = unique_verts.tolist()
-    return vertices, faces
+def load_cmb_as_mesh(cmb_path):
+    return read_cmb(cmb_path)
 
 
-def load_obj_as_mesh(obj_path):
-    obj_mesh = trimesh.load(obj_path)
-    return obj_mesh.vertices.tolist(), obj_mesh.faces.tolist()
+def load_glb_as_mesh(glb_path):
+    return read_glb(glb_path)
 
 
 def load_dxf_as_mesh(dxf_path):
-    doc = ezdxf.readfile(dxf_path)
-    msp = doc.modelspace()
-
-    vertices = []
-    faces = []
-    vert_cache = {}
-    idx_count = 0
-
-    for entity in msp.query("3DFACE"):
-        raw_pts = list(entity.wcs_vertices())
-        unique_pts = []
-        for pt in raw_pts:
-            if pt not in unique_pts:
-                unique_pts.append(pt)
-
-        face_indices = []
-        for pt in unique_pts:
-            if pt not in vert_cache:
-                vert_cache[pt] = idx_count
-                vertices.append(pt)
-                idx_count += 1
-            face_indices.append(vert_cache[pt])
-
-        if len(face_indices) == 3:
-            faces.append(face_indices)
-        elif len(face_indices) == 4:
-            faces.append([face_indices[0], face_indices[1], face_indices[2]])
-            faces.append([face_indices[0], face_indices[2], face_indices[3]])
-
-    return vertices, faces
-
-
-def mesh_to_occ_shape(vertices, faces):
-    builder = BRep_Builder()
-    compound = TopoDS_Compound()
-    builder.MakeCompound(compound)
-
-    for tri in faces:
-        if len(tri) < 3:
-            continue
-        p1 = gp_Pnt(*vertices[tri[0]])
-        p2 = gp_Pnt(*vertices[tri[1]])
-        p3 = gp_Pnt(*vertices[tri[2]])
-
-        polygon_maker = BRepBuilderAPI_MakePolygon(p1, p2, p3, True)
-        wire = polygon_maker.Wire()
-        face_maker = BRepBuilderAPI_MakeFace(wire)
-        if face_maker.IsDone():
-            face = face_maker.Face()
-            builder.Add(compound, face)
-
-    return compound
-
-
-def add_occ_shape_to_xcaf(doc, shape_tool, shape, label_name="TessellatedMesh"):
-    label = shape_tool.AddShape(shape)
-    shape_tool.SetShapeName(label, TCollection_ExtendedString(label_name))
-    return label
-
-
-def tessellate_step_shape(shape, deflection=0.1):
-    BRepMesh_IncrementalMesh(shape, deflection, True)
-    all_verts = []
-    all_faces = []
-    vert_cache = {}
-    idx_count = 0
-
-    exp = TopExp_Explorer(shape, TopAbs_FACE)
-    while exp.More():
-        face = TopoDS_Face(exp.Current())
-        triangulation = BRep_Tool.Triangulation(face, None)
-        if triangulation:
-            nodes = triangulation.Nodes()
-            triangles = triangulation.Triangles()
-
-            for i in range(1, nodes.Length() + 1):
-                p = nodes.Value(i)
-                coords = (p.X(), p.Y(), p.Z())
-                if coords not in vert_cache:
-                    vert_cache[coords] = idx_count
-                    all_verts.append(coords)
-                    idx_count += 1
-
-            for i in range(1, triangles.Length() + 1):
-                tri = triangles.Value(i)
-                i1, i2, i3 = tri.Get()
-                v1 = vert_cache[(nodes.Value(i1).X(), nodes.Value(i1).Y(), nodes.Value(i1).Z())]
-                v2 = vert_cache[(nodes.Value(i2).X(), nodes.Value(i2).Y(), nodes.Value(i2).Z())]
-                v3 = vert_cache[(nodes.Value(i3).X(), nodes.Value(i3).Y(), nodes.Value(i3).Z())]
-                all_faces.append([v1, v2, v3])
-        exp.Next()
-
-    return all_verts, all_faces
-
-
-def merge_files_to_step(filepaths, out_step):
-    master_doc, master_tool = create_empty_xcaf_doc()
+    return read_dxf(dxf_path)
 
-    for fpath in filepaths:
-        ext = os.path.splitext(fpath)[1].lower()
-        if ext == ".step":
-            sub_doc, sub_tool = load_step_xcaf(fpath)
-            merge_xcaf_docs_into(master_doc, master_tool, sub_doc)
-        elif ext in [".stl", ".obj", ".dxf"]:
-            if ext == ".stl":
-                v, f = load_stl_as_mesh(fpath)
-            elif ext == ".obj":
-                v, f = load_obj_as_mesh(fpath)
-            else:
-                v, f = load_dxf_as_mesh(fpath)
-            shape = mesh_to_occ_shape(v, f)
-            add_occ_shape_to_xcaf(master_doc, master_tool, shape, label_name=os.path.basename(fpath))
-        else:
-            print(f"Skipping unsupported format: {fpath}")
 
-    save_xcaf_to_step(master_doc, out_step)
+def load_step_as_mesh(step_path, linear_deflection=0.1, angular_deflection=0.5, parallel=True, select=None):
+    from . import stepio
 
+    return stepio.load_step_as_mesh(step_path, linear_deflection, angular_deflection, parallel, select)
 
-def merge_files_to_mesh(filepaths, out_path, out_format):
-    all_meshes = []
 
-    for fpath in filepaths:
-        ext = os.path.splitext(fpath)[1].lower()
-        if ext == ".stl":
-            v, fc = load_stl_as_mesh(fpath)
-        elif ext == ".obj":
-            v, fc = load_obj_as_mesh(fpath)
-        elif ext == ".dxf":
-            v, fc = load_dxf_as_mesh(fpath)
-        elif ext == ".step":
-            r = STEPControl_Reader()
-            st = r.ReadFile(fpath)
-            if st == IFSelect_RetDone:
-                r.TransferRoot(1)
-                shape = r.Shape()
-                v, fc = tessellate_step_shape(shape, 0.1)
-            else:
-                continue
-        else:
-            print(f"Skipping unsupported format: {fpath}")
-            continue
-        all_meshes.append((v, fc))
-
-    merged_vertices = []
-    merged_faces = []
-    offset = 0
-
-    for (v, fc) in all_meshes:
-        for face in fc:
-            merged_faces.append([idx + offset for idx in face])
-        merged_vertices.extend(v)
-        offset += len(v)
-
-    if out_format == "stl":
-        save_mesh_as_stl(merged_vertices, merged_faces, out_path)
-    elif out_format == "obj":
-        save_mesh_as_obj(merged_vertices, merged_faces, out_path)
-    elif out_format == "dxf":
-        save_mesh_as_dxf(merged_vertices, merged_faces, out_path)
-
-
-
-
-
-
-
-
-Commented Code:
-
-# Import standard libraries and external modules
-import os  # For file path handling
-import numpy as np  # For numerical operations and array handling
-import trimesh  # For loading and working with .obj mesh files
-from stl import mesh  # For loading STL mesh files
-import ezdxf  # For reading DXF files
-
-# Import OpenCascade (OCC) modules for handling CAD geometry and STEP formats
-from OCC.Core.XCAFApp import XCAFApp_Application  # To initiate XCAF document application
-from OCC.Core.XCAFDoc import XCAFDoc_DocumentTool  # Tools to manipulate shapes in XCAF
-from OCC.Core.TCollection import TCollection_ExtendedString  # For setting label names
-from OCC.Core.STEPCAFControl import STEPCAFControl_Reader, STEPCAFControl_Writer  # For STEP read/write with XCAF
-from OCC.Core.IFSelect import IFSelect_RetDone  # Status check for file read success
-from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh  # Tessellation of BRep shapes
-from OCC.Core.BRep import BRep_Tool  # To access geometry like triangulations
-from OCC.Core.TopExp import TopExp_Explorer  # To traverse shape topology
-from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Face  # OCC shape types
-from OCC.Core.TopAbs import TopAbs_FACE  # Enum for identifying face shapes
-from OCC.Core.gp import gp_Pnt  # Point class for geometric definitions
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakePolygon  # Tools to create faces and polygons
-from OCC.Core.BRep import BRep_Builder  # Builder to assemble shapes
-from OCC.Core.STEPControl import STEPControl_Reader  # For basic STEP file reading
-
-# Exporter functions assumed to be in a separate module for writing to STL/OBJ/DXF
-from .exporter import save_mesh_as_stl, save_mesh_as_obj, save_mesh_as_dxf
-
-# Create a new empty XCAF document and return the document and shape tool
-def create_empty_xcaf_doc():
-    app = XCAFApp_Application.GetApplication()  # Initialize the XCAF application
-    fmt = TCollection_ExtendedString("BinXCAF")  # Define binary XCAF format
-    doc_handle = app.NewDocument(fmt)  # Create new document
-    doc = doc_handle.get()  # Extract the document object
-    shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())  # Get shape manipulation tool
-    return doc, shape_tool
-
-# Load a STEP file into an XCAF document using STEPCAF reader
-def load_step_xcaf(filepath):
-    doc, shape_tool = create_empty_xcaf_doc()  # Create new empty XCAF doc
-    reader = STEPCAFControl_Reader()  # Initialize STEP reader
-    status = reader.ReadFile(filepath)  # Try to read STEP file
-    if status == IFSelect_RetDone:  # Check if reading was successful
-        reader.Transfer(doc.GetHandle())  # Transfer geometry into XCAF doc
-    else:
-        print(f"Failed to read STEP: {filepath}")
-    return doc, shape_tool  # Return document and shape tool
-
-# Merge all shapes from source_doc into target_doc
-def merge_xcaf_docs_into(target_doc, target_shape_tool, source_doc):
-    source_shape_tool = XCAFDoc_DocumentTool.ShapeTool(source_doc.Main())  # Get shape tool from source
-    it = source_shape_tool.NewIterator()  # Create iterator for source shapes
-    while it.More():
-        source_label = it.Value()  # Get shape label
-        source_shape_tool.CopyShape(source_label, target_shape_tool)  # Copy shape to target tool
-        it.Next()
-
-# Write the XCAF document to a STEP file using STEPCAF writer
-def save_xcaf_to_step(doc, out_path):
-    writer = STEPCAFControl_Writer()  # Initialize STEP writer
-    writer.Transfer(doc.GetHandle())  # Transfer all shapes in doc to writer
-    writer.Write(out_path)  # Write to file
-
-# Load an STL file and convert it into vertex and face lists
-def load_stl_as_mesh(stl_path):
-    stl_mesh = mesh.Mesh.from_file(stl_path)  # Load STL mesh
-    raw_verts = stl_mesh.vectors.reshape(-1, 3)  # Flatten triangle vectors into vertex list
-    unique_verts, inv = np.unique(raw_verts, axis=0, return_inverse=True)  # Remove duplicate vertices
-    faces = inv.reshape(-1, 3).tolist()  # Remap faces using unique indices
-    vertices = unique_verts.tolist()  # Convert vertices to list
-    return vertices, faces  # Return mesh data
-
-# Load an OBJ file using trimesh and extract vertex and face data
-def load_obj_as_mesh(obj_path):
-    obj_mesh = trimesh.load(obj_path)  # Load mesh using trimesh
-    return obj_mesh.vertices.tolist(), obj_mesh.faces.tolist()  # Return vertices and faces
+MESH_LOADERS = {
+    ".stl": load_stl_as_mesh,
+    ".obj": load_obj_as_mesh,
+    ".dxf": load_dxf_as_mesh,
+    ".cmb": load_cmb_as_mesh,
+    ".glb": load_glb_as_mesh,
+    ".step": load_step_as_mesh,
+}
 
-# Load a DXF file and extract 3D faces as mesh
-def load_dxf_as_mesh(dxf_path):
-    doc = ezdxf.readfile(dxf_path)  # Open DXF document
-    msp = doc.modelspace()  # Get model space
-
-    vertices = []
-    faces = []
-    vert_cache = {}  # Cache to avoid duplicate vertices
-    idx_count = 0  # Counter for indexing vertices
-
-    # Iterate over 3DFACE entities in the DXF
-    for entity in msp.query("3DFACE"):
-        raw_pts = list(entity.wcs_vertices())  # Get 3D face points
-        unique_pts = []
-        for pt in raw_pts:
-            if pt not in unique_pts:
-                unique_pts.append(pt)
-
-        face_indices = []
-        for pt in unique_pts:
-            if pt not in vert_cache:
-                vert_cache[pt] = idx_count
-                vertices.append(pt)
-                idx_count += 1
-            face_indices.append(vert_cache[pt])
-
-        # Add triangular or quad face (split into two triangles)
-        if len(face_indices) == 3:
-            faces.append(face_indices)
-        elif len(face_indices) == 4:
-            faces.append([face_indices[0], face_indices[1], face_indices[2]])
-            faces.append([face_indices[0], face_indices[2], face_indices[3]])
-
-    return vertices, faces
-
-# Convert a mesh (vertices and faces) into an OCC compound shape
-def mesh_to_occ_shape(vertices, faces):
-    builder = BRep_Builder()  # Create BRep builder
-    compound = TopoDS_Compound()  # Create a compound shape
-    builder.MakeCompound(compound)  # Initialize compound
-
-    for tri in faces:
-        if len(tri) < 3:
-            continue
-        # Convert vertex coordinates to OCC points
-        p1 = gp_Pnt(*vertices[tri[0]])
-        p2 = gp_Pnt(*vertices[tri[1]])
-        p3 = gp_Pnt(*vertices[tri[2]])
-
-        # Create polygon and face from triangle
-        polygon_maker = BRepBuilderAPI_MakePolygon(p1, p2, p3, True)
-        wire = polygon_maker.Wire()
-        face_maker = BRepBuilderAPI_MakeFace(wire)
-        if face_maker.IsDone():
-            face = face_maker.Face()
-            builder.Add(compound, face)  # Add face to compound
-
-    return compound  # Return assembled compound shape
-
-# Add OCC shape into XCAF document and assign a name
-def add_occ_shape_to_xcaf(doc, shape_tool, shape, label_name="TessellatedMesh"):
-    label = shape_tool.AddShape(shape)  # Add shape to shape tool
-    shape_tool.SetShapeName(label, TCollection_ExtendedString(label_name))  # Assign label name
-    return label
-
-# Tessellate a STEP shape and extract mesh (vertices and faces)
-def tessellate_step_shape(shape, deflection=0.1):
-    BRepMesh_IncrementalMesh(shape, deflection, True)  # Perform tessellation
-    all_verts = []
-    all_faces = []
-    vert_cache = {}
-    idx_count = 0
-
-    # Explore each face in the shape
-    exp = TopExp_Explorer(shape, TopAbs_FACE)
-    while exp.More():
-        face = TopoDS_Face(exp.Current())
-        triangulation = BRep_Tool.Triangulation(face, None)
-        if triangulation:
-            nodes = triangulation.Nodes()
-            triangles = triangulation.Triangles()
-
-            # Store unique vertex coordinates
-            for i in range(1, nodes.Length() + 1):
-                p = nodes.Value(i)
-                coords = (p.X(), p.Y(), p.Z())
-                if coords not in vert_cache:
-                    vert_cache[coords] = idx_count
-                    all_verts.append(coords)
-                    idx_count += 1
-
-            # Store triangle face indices
-            for i in range(1, triangles.Length() + 1):
-                tri = triangles.Value(i)
-                i1, i2, i3 = tri.Get()
-                v1 = vert_cache[(nodes.Value(i1).X(), nodes.Value(i1).Y(), nodes.Value(i1).Z())]
-                v2 = vert_cache[(nodes.Value(i2).X(), nodes.Value(i2).Y(), nodes.Value(i2).Z())]
-                v3 = vert_cache[(nodes.Value(i3).X(), nodes.Value(i3).Y(), nodes.Value(i3).Z())]
-                all_faces.append([v1, v2, v3])
-        exp.Next()
-
-    return all_verts, all_faces  # Return tessellated mesh
-
-# Merge various CAD files into a unified STEP file
-def merge_files_to_step(filepaths, out_step):
-    master_doc, master_tool = create_empty_xcaf_doc()  # Start master doc
 
-    for fpath in filepaths:
-        ext = os.path.splitext(fpath)[1].lower()
-        if ext == ".step":
-            sub_doc, sub_tool = load_step_xcaf(fpath)
-            merge_xcaf_docs_into(master_doc, master_tool, sub_doc)
-        elif ext in [".stl", ".obj", ".dxf"]:
-            if ext == ".stl":
-                v, f = load_stl_as_mesh(fpath)
-            elif ext == ".obj":
-                v, f = load_obj_as_mesh(fpath)
-            else:
-                v, f = load_dxf_as_mesh(fpath)
-            shape = mesh_to_occ_shape(v, f)
-            add_occ_shape_to_xcaf(master_doc, master_tool, shape, label_name=os.path.basename(fpath))
+def load_mesh_file(fpath, linear_deflection=0.1, angular_deflection=0.5, parallel_meshing=True,
+                   cache=None, weld=True, step_select=None):
+    ext = os.path.splitext(fpath)[1].lower()
+    if ext not in MESH_LOADERS:
+        raise ValueError(f"Unsupported format: {fpath}")
+
+    params = {"format": ext}
+    if ext == ".step":
+        params.update(linear_deflection=linear_deflection, angular_deflection=angular_deflection)
+        if step_select:
+            params.update(select=sorted(step_select))
+
+        def load(path):
+            return load_step_as_mesh(path, linear_deflection, angular_deflection, parallel_meshing, step_select)
+    elif ext == ".stl" and not weld:
+        params.update(weld=False)
+
+        def load(path):
+            return load_stl_as_mesh(path, weld=False)
+    else:
+        load = MESH_LOADERS[ext]
+
+    with stage("load", file=os.path.basename(fpath), format=ext, bytes_read=os.path.getsize(fpath)) as record:
+        # .cmb is already a memory-mapped container
+        if cache is not None and ext != ".cmb":
+            hits = cache.hits
+            mesh_data = cache.get_or_load(fpath, load, params)
+            record["cache_hit"] = cache.hits > hits
         else:
-            print(f"Skipping unsupported format: {fpath}")
+            mesh_data = load(fpath)
+        record.update(triangles=mesh_data.n_faces, vertices=mesh_data.n_vertices)
+    return mesh_data
+
+
+def report_failures(results):
+    failures = [(r.path, r.error) for r in results if r.error is not None]
+    for fpath, error in failures:
+        print(f"Failed to load {fpath}: {error}")
+    return failures
+
+
+STEP_MESH_INPUTS = (".stl", ".obj", ".dxf", ".cmb", ".glb")
+# outputs that can store a part once and place it several times
+INSTANCE_FORMATS = ("step", "dxf", "cmb", "glb")
+
+
+def _named_parts(mesh_data, name):
+    # a multi-part container contributes one mesh per part, named after it
+    return [MeshData(part.vertices, part.faces, part.name if mesh_data.parts and part.name else name)
+            for part in mesh_data.iter_parts()]
+
+
+def merge_files_to_step(filepaths, out_step, workers=1, cache=None, step_mesh_mode="shell", step_select=None,
+                        incremental=None, instances=False):
+    # STEP inputs are always re-read: only their XCAF transfer keeps names
+    # and colours, so incremental runs reuse the loaded mesh inputs.
+    state = None
+    if incremental:
+        state = IncrementalState(incremental, cache)
+        settings = {"format": "step", "step_mesh_mode": step_mesh_mode, "step_select": step_select}
+        if instances:
+            settings["instances"] = True
+        if state.up_to_date(filepaths, settings, [out_step]):
+            print(f"{out_step} is up to date")
+            return []
+        cache = state
 
-    save_xcaf_to_step(master_doc, out_step)
+    from . import stepio
 
-# Merge various CAD files and output as a unified mesh file (stl/obj/dxf)
-def merge_files_to_mesh(filepaths, out_path, out_format):
-    all_meshes = []
+    master_doc, master_tool = stepio.create_empty_xcaf_doc()
+
+    mesh_inputs = [f for f in filepaths if os.path.splitext(f)[1].lower() in STEP_MESH_INPUTS]
+    loaded = {r.path: r for r in load_files_parallel(mesh_inputs, workers, cache=cache)}
+    failures = report_failures(loaded.values())
+
+    # a STEP file repeated in the inputs is read and transferred once
+    step_inputs = [f for f in filepaths if os.path.splitext(f)[1].lower() == ".step"]
+    step_sources = {f: step_inputs[i] for f, i in zip(step_inputs, duplicate_sources(step_inputs))}
+    step_docs = {}
+    step_errors = {}
+    step_uses = {}
+    placed = []
 
     for fpath in filepaths:
         ext = os.path.splitext(fpath)[1].lower()
-        if ext == ".stl":
-            v, fc = load_stl_as_mesh(fpath)
-        elif ext == ".obj":
-            v, fc = load_obj_as_mesh(fpath)
-        elif ext == ".dxf":
-            v, fc = load_dxf_as_mesh(fpath)
-        elif ext == ".step":
-            r = STEPControl_Reader()
-            st = r.ReadFile(fpath)
-            if st == IFSelect_RetDone:
-                r.TransferRoot(1)
-                shape = r.Shape()
-                v, fc = tessellate_step_shape(shape, 0.1)
+        name = os.path.basename(fpath)
+        if ext == ".step":
+            source = step_sources[fpath]
+            if source not in step_docs and source not in step_errors:
+                with stage("step_xcaf_read", file=name, bytes_read=os.path.getsize(fpath)):
+                    try:
+                        step_docs[source], _ = stepio.load_step_xcaf(fpath, step_select)
+                    except (IOError, ValueError) as ex:
+                        step_errors[source] = f"{type(ex).__name__}: {ex}"
             else:
+                with stage("step_xcaf_read", file=name, duplicate_of=os.path.basename(source)):
+                    pass
+            if source in step_errors:
+                print(f"Failed to load {fpath}: {step_errors[source]}")
+                failures.append((fpath, step_errors[source]))
                 continue
+            if instances:
+                step_uses.setdefault(source, []).append(name)
+                continue
+            with stage("xcaf_copy", file=name):
+                stepio.merge_xcaf_docs_into(master_doc, master_tool, step_docs[source])
+        elif ext in STEP_MESH_INPUTS:
+            mesh_data = loaded[fpath].mesh
+            if mesh_data is None:
+                continue
+            # a multi-part container becomes one labelled shape per part
+            for part in _named_parts(mesh_data, name):
+                if instances:
+                    placed.append(part)
+                    continue
+                with stage("mesh_to_occ_shape", file=name, mode=step_mesh_mode,
+                           triangles=part.n_faces, vertices=part.n_vertices):
+                    shape = stepio.mesh_to_occ_shape(part, step_mesh_mode)
+                with stage("xcaf_add", file=name):
+                    stepio.add_occ_shape_to_xcaf(master_doc, master_tool, shape, label_name=part.name)
         else:
             print(f"Skipping unsupported format: {fpath}")
+
+    # A STEP input repeated in the inputs is added once and placed as one
+    # component per use, instead of being deep-copied for each; used once,
+    # it is copied with its labels, names and colours.
+    for source, names in step_uses.items():
+        if len(names) == 1:
+            with stage("xcaf_copy", file=names[0]):
+                stepio.merge_xcaf_docs_into(master_doc, master_tool, step_docs[source])
             continue
-        all_meshes.append((v, fc))
-
-    # Combine all meshes into one
-    merged_vertices = []
-    merged_faces = []
-    offset = 0
-
-    for (v, fc) in all_meshes:
-        for face in fc:
-            merged_faces.append([idx + offset for idx in face])
-        merged_vertices.extend(v)
-        offset += len(v)
-
-    # Export to desired mesh format
-    if out_format == "stl":
-        save_mesh_as_stl(merged_vertices, merged_faces, out_path)
-    elif out_format == "obj":
-        save_mesh_as_obj(merged_vertices, merged_faces, out_path)
-    elif out_format == "dxf":
-        save_mesh_as_dxf(merged_vertices, merged_faces, out_path)
+        with stage("xcaf_add", file=os.path.basename(source), instances=len(names)):
+            stepio.add_occ_instances_to_xcaf(
+                master_doc, master_tool, stepio.xcaf_doc_shape(step_docs[source]),
+                [(n, (0.0, 0.0, 0.0)) for n in names], label_name=os.path.basename(source), make_assembly=True,
+            )
+
+    # Repeated geometry becomes one shape placed as located components,
+    # instead of one converted shape per copy.
+    prototypes, placements = find_instances(placed)
+    groups = [[] for _ in prototypes]
+    for instance in placements:
+        groups[instance.prototype].append((instance.name, instance.translation))
+    for prototype, group in zip(prototypes, groups):
+        with stage("mesh_to_occ_shape", file=prototype.name, mode=step_mesh_mode, instances=len(group),
+                   triangles=prototype.n_faces, vertices=prototype.n_vertices):
+            shape = stepio.mesh_to_occ_shape(prototype, step_mesh_mode)
+        with stage("xcaf_add", file=prototype.name, instances=len(group)):
+            if len(group) == 1:
+                stepio.add_occ_shape_to_xcaf(master_doc, master_tool, shape, label_name=prototype.name)
+            else:
+                stepio.add_occ_instances_to_xcaf(master_doc, master_tool, shape, group, label_name=prototype.name)
+
+    with stage("write", format="step") as record:
+        stepio.save_xcaf_to_step(master_doc, out_step, tessellated=step_mesh_mode == "tessellated")
+        record["bytes_written"] = os.path.getsize(out_step)
+    if state is not None:
+        state.commit(filepaths, settings, [out_step], complete=not failures)
+    return failures
+
+
+def merge_files_to_mesh(filepaths, out_path, out_format, workers=1,
+                        linear_deflection=0.1, angular_deflection=0.5, cache=None, dxf_mode="3dface",
+                        weld_tolerance=None, drop_degenerate=False, drop_duplicates=False,
+                        stream=False, chunk_bytes=None, decimate_ratio=None, max_error=None, lods=(),
+                        step_select=None, incremental=None, instances=False, glb_quantize=None,
+                        glb_narrow_indices=True):
+    inputs = []
+    for fpath in filepaths:
+        if os.path.splitext(fpath)[1].lower() in MESH_LOADERS:
+            inputs.append(fpath)
+        else:
+            print(f"Skipping unsupported format: {fpath}")
 
+    if stream:
+        if weld_tolerance is not None or drop_duplicates:
+            raise ValueError("Welding and duplicate removal need the whole mesh and cannot be streamed")
+        if decimate_ratio is not None or max_error is not None or lods:
+            raise ValueError("Decimation needs whole parts and cannot be streamed")
+        if incremental:
+            raise ValueError("Incremental merges keep whole parts and cannot be streamed")
+        if instances:
+            raise ValueError("Instancing compares whole parts and cannot be streamed")
+        options = {"chunk_bytes": chunk_bytes} if chunk_bytes else {}
+        return stream_files_to_mesh(
+            inputs, out_path, out_format, linear_deflection=linear_deflection,
+            angular_deflection=angular_deflection, dxf_mode=dxf_mode, drop_degenerate=drop_degenerate,
+            step_select=step_select, glb_quantize=glb_quantize, glb_narrow_indices=glb_narrow_indices,
+            **options,
+        )
+
+    # Instanced output keeps every part apart; STL and OBJ cannot hold
+    # instances and are written expanded.
+    instances = instances and out_format in INSTANCE_FORMATS
+    if instances and (weld_tolerance is not None or drop_duplicates):
+        raise ValueError("Welding and duplicate removal work on the merged mesh and cannot be instanced")
+    if instances and (decimate_ratio is not None or max_error is not None or lods):
+        raise ValueError("Decimated levels are written from the merged mesh and cannot be instanced")
+
+    # Unchanged inputs are mapped back from the last run's intermediates;
+    # the merge and write stages always run, so the output matches a full
+    # rebuild.
+    state = None
+    if incremental:
+        state = IncrementalState(incremental, cache)
+        settings = {
+            "format": out_format, "linear_deflection": linear_deflection,
+            "angular_deflection": angular_deflection, "dxf_mode": dxf_mode, "weld_tolerance": weld_tolerance,
+            "drop_degenerate": drop_degenerate, "drop_duplicates": drop_duplicates,
+            "decimate_ratio": decimate_ratio, "max_error": max_error, "lods": list(lods),
+            "step_select": step_select,
+        }
+        if instances:
+            settings["instances"] = True
+        if out_format == "glb":
+            settings.update(glb_quantize=glb_quantize, glb_narrow_indices=glb_narrow_indices)
+        output_paths = [out_path] + [lod_path(out_path, level) for level in range(1, len(lods) + 1)]
+        if state.up_to_date(inputs, settings, output_paths):
+            print(f"{out_path} is up to date")
+            return []
+        cache = state
+
+    # OCC's own parallel mesher would oversubscribe the cores already used
+    # by a multi-process load, so only enable it for in-process loading.
+    # STL facets re-exported to STL need no shared vertices unless the
+    # merge stage looks at them.
+    results = load_files_parallel(
+        inputs, workers,
+        linear_deflection=linear_deflection,
+        angular_deflection=angular_deflection,
+        parallel_meshing=resolve_workers(workers, len(inputs)) == 1,
+        cache=cache,
+        weld=out_format != "stl" or weld_tolerance is not None or drop_duplicates,
+        step_select=step_select,
+    )
+    failures = report_failures(results)
+    if instances:
+        with stage("instances") as record:
+            prototypes, placements = find_instances(
+                part for r in results if r.mesh is not None
+                for part in _named_parts(r.mesh, os.path.basename(r.path))
+            )
+            if drop_degenerate:
+                prototypes = [select_faces(p, ~degenerate_faces(p)) for p in prototypes]
+            record.update(prototypes=len(prototypes), instances=len(placements),
+                          triangles=sum(p.n_faces for p in prototypes))
+        write_instances_file(prototypes, placements, out_path, out_format, dxf_mode, glb_quantize,
+                             glb_narrow_indices)
+        if state is not None:
+            state.commit(inputs, settings, output_paths, complete=not failures)
+        return failures
+
+    with stage("merge") as record:
+        merged = merge_meshes(
+            (r.mesh for r in results if r.mesh is not None),
+            weld_tolerance=weld_tolerance, drop_degenerate=drop_degenerate, drop_duplicates=drop_duplicates,
+        )
+        record.update(triangles=merged.n_faces, vertices=merged.n_vertices)
+
+    # every level is simplified from the full-resolution merge
+    levels = [(out_path, decimate_ratio)] if decimate_ratio is not None or max_error is not None else []
+    levels += [(lod_path(out_path, level), ratio) for level, ratio in enumerate(lods, 1)]
+    outputs = [] if levels and levels[0][0] == out_path else [(out_path, merged)]
+    for level_path, ratio in levels:
+        with stage("decimate", ratio=ratio, max_error=max_error) as record:
+            decimated = decimate_parts(merged, workers, ratio=ratio, max_error=max_error)
+            record.update(triangles=decimated.n_faces, vertices=decimated.n_vertices)
+        outputs.append((level_path, decimated))
+
+    for level_path, mesh_data in outputs:
+        write_mesh_file(mesh_data, level_path, out_format, dxf_mode, glb_quantize, glb_narrow_indices)
+    if state is not None:
+        state.commit(inputs, settings, output_paths, complete=not failures)
+    return failures
+
+
+def lod_path(out_path, level):
+    stem, ext = os.path.splitext(out_path)
+    return f"{stem}_lod{level}{ext}"
+
+
+def write_instances_file(prototypes, instances, out_path, out_format, dxf_mode="3dface", glb_quantize=None,
+                         glb_narrow_indices=True):
+    with stage("write", format=out_format, instances=len(instances),
+               triangles=sum(p.n_faces for p in prototypes)) as record:
+        if out_format == "dxf":
+            save_instances_as_dxf(prototypes, instances, out_path, mode=dxf_mode)
+        elif out_format == "cmb":
+            save_instances_as_cmb(prototypes, instances, out_path)
+        elif out_format == "glb":
+            save_instances_as_glb(prototypes, instances, out_path, glb_quantize, glb_narrow_indices)
+        else:
+            raise ValueError(f"{out_format} output cannot hold instances")
+        record["bytes_written"] = os.path.getsize(out_path)
+
+
+def write_mesh_file(mesh_data, out_path, out_format, dxf_mode="3dface", glb_quantize=None,
+                    glb_narrow_indices=True):
+    with stage("write", format=out_format, triangles=mesh_data.n_faces, vertices=mesh_data.n_vertices) as record:
+        if out_format == "stl":
+            save_mesh_as_stl(mesh_data, out_path)
+        elif out_format == "obj":
+            save_mesh_as_obj(mesh_data, out_path)
+        elif out_format == "dxf":
+            save_mesh_as_dxf(mesh_data, out_path, mode=dxf_mode)
+        elif out_format == "cmb":
+            save_mesh_as_cmb(mesh_data, out_path)
+        elif out_format == "glb":
+            save_mesh_as_glb(mesh_data, out_path, glb_quantize, glb_narrow_indices)
+        else:
+            raise ValueError(f"Unsupported output format: {out_format}")
+        record["bytes_written"] = os.path.getsize(out_path)
@@ -0,0 +1,297 @@
+import asyncio
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .cache import DEFAULT_CACHE_DIR
+from .instrument import QueueSink
+
+DEFAULT_SOCKET = os.path.join(DEFAULT_CACHE_DIR, "daemon.sock")
+# finished jobs kept for status queries
+FINISHED_JOBS_KEPT = 1000
+
+# Protocol: one JSON object per line in each direction.
+#   {"op": "submit", "job": {...}, "priority": 0, "follow": true}
+#   {"op": "follow", "id": ...}   {"op": "status", "id": ...}
+#   {"op": "cancel", "id": ...}   {"op": "stats"}
+# A job is a batch manifest job; a higher priority runs earlier. Following a
+# job streams "queued", "started", "stage" and "done" events.
+
+_progress = None
+
+
+def _warm_worker(progress, preload_step):
+    # Runs once per pool process: the imports and OCC application setup
+    # every job would otherwise pay are done before the first job arrives.
+    global _progress
+    _progress = progress
+    importlib.import_module(".converters", __package__)
+
+    if preload_step:
+        try:
+            from . import stepio
+        except ImportError:
+            return
+        stepio.create_empty_xcaf_doc()
+
+
+def _run_in_worker(job_id, job):
+    from .cli import run_job
+
+    try:
+        return run_job(job, sinks=[QueueSink(_progress, job_id)])
+    finally:
+        # marks the end of this job's records
+        _progress.put((job_id, None))
+
+
+class Job:
+    def __init__(self, spec, priority):
+        self.id = uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.priority = priority
+        self.state = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.result = None
+        self.inputs_done = 0
+        self.events = []
+        self.changed = asyncio.Event()
+        self.relayed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append({"id": self.id, **event})
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def status(self):
+        return {
+            "id": self.id, "state": self.state, "priority": self.priority, "output": self.spec.get("output"),
+            "inputs": len(self.spec.get("inputs", [])), "inputs_done": self.inputs_done,
+            "queued_s": round((self.started or time.time()) - self.submitted, 6),
+            "result": self.result,
+        }
+
+
+class ConversionDaemon:
+    def __init__(self, workers=None, preload_step=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.preload_step = preload_step
+        self.context = multiprocessing.get_context()
+        # A manager queue's put returns once the record is stored, so every
+        # record of a job is queued before its result comes back.
+        self.manager = self.context.Manager()
+        self.progress = self.manager.Queue()
+        self.pool = self._new_pool()
+        self.pool_lock = asyncio.Lock()
+        self.queue = asyncio.PriorityQueue()
+        self.jobs = {}
+        self.order = itertools.count()
+        self.completed = 0
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=self.context,
+            initializer=_warm_worker, initargs=(self.progress, self.preload_step),
+        )
+
+    async def _replace_pool(self, broken):
+        # Every job running in a broken pool fails with it; only the first
+        # to get here replaces it, and the others find the new one in place.
+        async with self.pool_lock:
+            if self.pool is broken:
+                broken.shutdown(wait=False)
+                self.pool = self._new_pool()
+
+    def submit(self, spec, priority=0):
+        if not spec.get("inputs") or not spec.get("output"):
+            raise ValueError("A job needs inputs and an output")
+        job = Job(spec, priority)
+        self.jobs[job.id] = job
+        self.queue.put_nowait((-priority, next(self.order), job.id))
+        job.publish({"event": "queued", "position": self.queue.qsize()})
+        return job
+
+    def cancel(self, job_id):
+        # only queued jobs can be cancelled; a running merge is left to finish
+        job = self.jobs[job_id]
+        if job.state != "queued":
+            return False
+        job.state = "cancelled"
+        job.publish({"event": "done", "state": "cancelled"})
+        return True
+
+    def _forget_finished(self):
+        finished = [j for j in self.jobs.values() if j.state not in ("queued", "running")]
+        for job in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self.jobs[job.id]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.state != "queued":
+                continue
+            job.state = "running"
+            job.started = time.time()
+            job.publish({"event": "started", "queued_s": round(job.started - job.submitted, 6)})
+            async with self.pool_lock:
+                pool = self.pool
+            try:
+                job.result = await loop.run_in_executor(pool, _run_in_worker, job.id, job.spec)
+                try:
+                    await asyncio.wait_for(job.relayed.wait(), 5.0)
+                except asyncio.TimeoutError:
+                    pass
+            except BrokenProcessPool as ex:
+                # a worker died (e.g. a crash in OCC); start a fresh pool
+                job.result = {"status": "failed", "error": f"{type(ex).__name__}: {ex}"}
+                await self._replace_pool(pool)
+            except Exception as ex:
+                job.result = {"status": "failed", "error": f"{type(ex).__name__}: {ex}"}
+            job.state = job.result["status"]
+            self.completed += 1
+            job.publish({"event": "done", "state": job.state, "result": job.result})
+            self._forget_finished()
+
+    async def _relay_progress(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # a bounded wait so the reader thread never outlives the loop
+            try:
+                job_id, record = await loop.run_in_executor(None, self.progress.get, True, 0.5)
+            except queue.Empty:
+                continue
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            if record is None:
+                job.relayed.set()
+                continue
+            if record.get("stage") in ("load", "stream", "step_xcaf_read"):
+                job.inputs_done += 1
+            job.publish({"event": "stage", "inputs_done": job.inputs_done, "record": record})
+
+    def stats(self):
+        states = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {"workers": self.workers, "queued": self.queue.qsize(), "completed": self.completed,
+                "jobs": states}
+
+    async def _follow(self, job, writer):
+        sent = 0
+        while True:
+            changed = job.changed
+            for event in job.events[sent:]:
+                writer.write((json.dumps(event) + "\n").encode("utf-8"))
+                if event["event"] == "done":
+                    await writer.drain()
+                    return
+            sent = len(job.events)
+            await writer.drain()
+            await changed.wait()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "submit":
+                        job = self.submit(request["job"], request.get("priority", 0))
+                        if request.get("follow"):
+                            await self._follow(job, writer)
+                            continue
+                        reply = job.status()
+                    elif op == "follow":
+                        await self._follow(self.jobs[request["id"]], writer)
+                        continue
+                    elif op == "status":
+                        reply = self.jobs[request["id"]].status()
+                    elif op == "cancel":
+                        reply = {"id": request["id"], "cancelled": self.cancel(request["id"])}
+                    elif op == "stats":
+                        reply = self.stats()
+                    else:
+                        raise ValueError(f"Unknown op: {op}")
+                except KeyError as ex:
+                    reply = {"error": f"Unknown job or missing field: {ex}"}
+                except (ValueError, TypeError) as ex:
+                    reply = {"error": str(ex)}
+                writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=DEFAULT_SOCKET, host=None, port=None):
+        if port is not None:
+            server = await asyncio.start_server(self._handle, host or "127.0.0.1", port)
+        else:
+            os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self._handle, socket_path)
+        # warm every worker before accepting work
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)))
+        tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        tasks.append(asyncio.create_task(self._relay_progress()))
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.manager.shutdown()
+            if port is None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+async def _request(message, socket_path=DEFAULT_SOCKET, host=None, port=None, on_event=None):
+    if port is not None:
+        reader, writer = await asyncio.open_connection(host or "127.0.0.1", port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write((json.dumps(message) + "\n").encode("utf-8"))
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Daemon closed the connection")
+            reply = json.loads(line)
+            # without follow the single reply is the answer
+            if on_event is None or "event" not in reply:
+                return reply
+            on_event(reply)
+            if reply["event"] == "done":
+                return reply
+    finally:
+        writer.close()
+
+
+def request(message, socket_path=DEFAULT_SOCKET, host=None, port=None, on_event=None):
+    return asyncio.run(_request(message, socket_path, host, port, on_event))
+
+
+def serve(workers=None, socket_path=DEFAULT_SOCKET, host=None, port=None, preload_step=True):
+    asyncio.run(ConversionDaemon(workers, preload_step).serve(socket_path, host, port))
@@ -0,0 +1,142 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .meshdata import MeshData, concatenate_meshes, unique_rows
+from .parallel import resolve_workers
+
+# singular values below this fraction of the largest are treated as zero
+# when solving a cluster's quadric, so flat and creased regions stay put
+_SVD_CUTOFF = 1e-3
+_BUDGET_STEPS = 10
+
+
+def _face_planes(vertices, faces):
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    double_area = np.linalg.norm(normals, axis=1)
+    normals /= np.where(double_area > 0, double_area, 1.0)[:, None]
+    offsets = -np.einsum("ij,ij->i", normals, a)
+    return np.column_stack([normals, offsets]), 0.5 * double_area
+
+
+def _cluster_positions(vertices, faces, cells, cluster, cell_size):
+    # Sum the area-weighted plane quadrics of the faces around each cluster
+    # and place its vertex where the summed quadric is smallest, solved
+    # about the cluster centroid and kept inside the cluster's cell.
+    n_clusters = len(cells)
+    planes, areas = _face_planes(vertices, faces)
+    pairs = [(i, j) for i in range(4) for j in range(i, 4)]
+    corner_cluster = cluster[faces].ravel()
+    q = np.empty((n_clusters, 4, 4))
+    for i, j in pairs:
+        weights = np.repeat(planes[:, i] * planes[:, j] * areas, 3)
+        q[:, i, j] = q[:, j, i] = np.bincount(corner_cluster, weights, minlength=n_clusters)
+
+    counts = np.bincount(cluster, minlength=n_clusters)
+    centroid = np.stack([np.bincount(cluster, vertices[:, k], minlength=n_clusters) for k in range(3)], axis=1)
+    centroid /= counts[:, None]
+
+    a, b = q[:, :3, :3], q[:, :3, 3]
+    u, s, vt = np.linalg.svd(a)
+    inv_s = np.where(s > _SVD_CUTOFF * s[:, :1], 1.0 / np.where(s > 0, s, 1.0), 0.0)
+    residual = -b - np.einsum("kij,kj->ki", a, centroid)
+    # pseudo-inverse step V diag(1/s) U^T r
+    step = np.einsum("kji,kj->ki", vt, inv_s * np.einsum("kji,kj->ki", u, residual))
+    positions = centroid + step
+
+    cell_min = cells * cell_size
+    return np.clip(positions, cell_min, cell_min + cell_size)
+
+
+def _collapse(faces, cluster):
+    collapsed = cluster[faces]
+    keep = ((collapsed[:, 0] != collapsed[:, 1]) & (collapsed[:, 1] != collapsed[:, 2])
+            & (collapsed[:, 0] != collapsed[:, 2]))
+    collapsed = collapsed[keep]
+    first, _ = unique_rows(np.sort(collapsed, axis=1))
+    return collapsed[np.sort(first)]
+
+
+def _clusters(vertices, cell_size):
+    cells = np.floor(vertices / cell_size).astype(np.int64)
+    first, cluster = unique_rows(cells)
+    return cells[first], cluster
+
+
+def cluster_decimate(mesh_data, cell_size):
+    if not mesh_data.n_faces:
+        return mesh_data.copy()
+    vertices = mesh_data.vertices.astype(np.float64)
+    cells, cluster = _clusters(vertices, cell_size)
+    faces = _collapse(mesh_data.faces, cluster)
+    positions = _cluster_positions(vertices, mesh_data.faces, cells, cluster, cell_size)
+
+    used, local = np.unique(faces, return_inverse=True)
+    return MeshData(positions[used].astype(mesh_data.vertices.dtype), local.reshape(-1, 3), mesh_data.name)
+
+
+def _cell_size_for_budget(mesh_data, target_triangles):
+    vertices = mesh_data.vertices.astype(np.float64)
+
+    def n_faces(cell_size):
+        return len(_collapse(mesh_data.faces, _clusters(vertices, cell_size)[1]))
+
+    # a cluster of side h covers about h^2 of surface and yields about two
+    # triangles, which brackets the search
+    _, areas = _face_planes(vertices, mesh_data.faces)
+    estimate = math.sqrt(2.0 * max(areas.sum(), 1e-300) / max(target_triangles, 1))
+    lo, hi = estimate / 4, estimate * 4
+    for _ in range(_BUDGET_STEPS):
+        if n_faces(hi) <= target_triangles:
+            break
+        lo, hi = hi, hi * 4
+    for _ in range(_BUDGET_STEPS):
+        if n_faces(lo) > target_triangles:
+            break
+        lo, hi = lo / 4, lo
+    # log-space bisection for the finest grid that meets the budget
+    for _ in range(_BUDGET_STEPS):
+        mid = math.sqrt(lo * hi)
+        if n_faces(mid) > target_triangles:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def decimate(mesh_data, ratio=None, target_triangles=None, max_error=None):
+    if target_triangles is None and ratio is not None:
+        target_triangles = max(int(math.ceil(mesh_data.n_faces * ratio)), 1)
+    if target_triangles is not None:
+        if mesh_data.n_faces <= target_triangles:
+            return mesh_data.copy()
+        cell_size = _cell_size_for_budget(mesh_data, target_triangles)
+        if max_error is not None:
+            cell_size = min(cell_size, max_error / math.sqrt(3))
+    elif max_error is not None:
+        # vertices stay inside their cell, so they move by at most its diagonal
+        cell_size = max_error / math.sqrt(3)
+    else:
+        raise ValueError("Decimation needs a ratio, a triangle budget or an error bound")
+    return cluster_decimate(mesh_data, cell_size)
+
+
+def _decimate_part(part, options):
+    return decimate(part, **options)
+
+
+def decimate_parts(mesh_data, workers=1, **options):
+    # Parts are simplified independently, which lets them run in parallel;
+    # a ratio or error bound applies to each part on its own.
+    parts = list(mesh_data.iter_parts())
+    workers = resolve_workers(workers, len(parts))
+    if workers == 1:
+        decimated = [decimate(part, **options) for part in parts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            decimated = list(pool.map(_decimate_part, parts, [options] * len(parts)))
+    for part, result in zip(parts, decimated):
+        result.name = part.name
+    return concatenate_meshes(decimated, mesh_data.name, track_parts=bool(mesh_data.parts))
@@ -0,0 +1,343 @@
+import mmap
+import os
+import re
+from operator import itemgetter
+
+import numpy as np
+
+from .meshdata import MeshData, concatenate_meshes, fan_triangulate, mesh_from_triangles, weld_vertices
+from .objio import OBJ_WRITE_ROWS, write_rows
+
+DXF_CHUNK_BYTES = 16 << 20
+# R12 POLYFACE vertex and face counts and indices are 16-bit
+DXF_POLYFACE_LIMIT = 32767
+
+_SECTION_RE = re.compile(rb"\n[ \t]*2\r?\nENTITIES\r?\n")
+_ENDSEC_RE = re.compile(rb"\n[ \t]*0\r?\nENDSEC\r?\n")
+# A group code 0 line followed by an entity name. Value lines are always
+# followed by a numeric code line, so this only matches entity starts.
+_ENTITY_START_RE = re.compile(rb"\n[ \t]*0\r?\n(?=[A-Z_]|3D)")
+
+# 3DFACE corner codes 10-13 (x), 20-23 (y), 30-33 (z) -> corner * 3 + axis
+_MAX_GROUP_CODE = 1071
+_CORNER_SLOT = np.full(_MAX_GROUP_CODE + 1, -1, dtype=np.int64)
+for _code in (10, 11, 12, 13, 20, 21, 22, 23, 30, 31, 32, 33):
+    _CORNER_SLOT[_code] = (_code % 10) * 3 + _code // 10 - 1
+
+
+def quads_to_triangles(corners):
+    # A 3DFACE stores a triangle by repeating one corner; splitting every
+    # face into (0, 1, 2) and (0, 2, 3) and dropping triangles with a
+    # repeated corner handles every way of doing that.
+    corners = np.asarray(corners, dtype=np.float64).reshape(-1, 4, 3)
+    triangles = np.stack([corners[:, [0, 1, 2]], corners[:, [0, 2, 3]]], axis=1).reshape(-1, 3, 3)
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    distinct = (a != b).any(axis=1) & (b != c).any(axis=1) & (a != c).any(axis=1)
+    return triangles[distinct]
+
+
+def _pick(values, indices):
+    indices = indices.tolist()
+    if len(indices) < 2:
+        return [values[i] for i in indices]
+    return itemgetter(*indices)(values)
+
+
+def _scan_chunk(chunk):
+    lines = chunk.splitlines()
+    values = lines[1::2]
+    codes = np.fromstring(b"\n".join(lines[0::2]), dtype=np.int32, sep=" ")
+    if len(values) != len(codes):
+        raise ValueError("Malformed DXF tag")
+
+    entity = np.cumsum(codes == 0) - 1
+    types = [t.strip() for t in _pick(values, np.flatnonzero(codes == 0))]
+    is_face = np.array([t == b"3DFACE" for t in types], dtype=bool)
+    for i in np.flatnonzero(codes == 67).tolist():
+        if values[i].strip() == b"1":
+            is_face[entity[i]] = False
+
+    slots = _CORNER_SLOT[np.clip(codes, 0, _MAX_GROUP_CODE)]
+    selected = np.flatnonzero(is_face[entity] & (slots >= 0))
+    face_rank = np.cumsum(is_face) - 1
+
+    corners = np.full((int(is_face.sum()), 12), np.nan)
+    if len(selected):
+        coords = np.fromstring(b"\n".join(_pick(values, selected)), sep=" ")
+        if len(coords) != len(selected):
+            raise ValueError("Malformed 3DFACE coordinate")
+        corners[face_rank[entity[selected]], slots[selected]] = coords
+    corners = corners.reshape(-1, 4, 3)
+    missing_last = np.isnan(corners[:, 3]).any(axis=1)
+    corners[missing_last, 3] = corners[missing_last, 2]
+    return np.nan_to_num(corners), set(types)
+
+
+def is_binary_dxf(dxf_path):
+    with open(dxf_path, "rb") as fh:
+        return fh.read(18) == b"AutoCAD Binary DXF"
+
+
+def _iter_3dface_chunks(dxf_path, chunk_bytes=DXF_CHUNK_BYTES):
+    # (corners, entity types) per entity-aligned chunk of an ASCII file's
+    # ENTITIES section
+    with open(dxf_path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        section = _SECTION_RE.search(data)
+        if section is None:
+            return
+        end = _ENDSEC_RE.search(data, section.end())
+        end = end.start() + 1 if end else len(data)
+
+        start = section.end()
+        while start < end:
+            cut = _ENTITY_START_RE.search(data, min(start + chunk_bytes, end), end)
+            stop = cut.start() + 1 if cut else end
+            yield _scan_chunk(data[start:stop])
+            start = stop
+    finally:
+        data.close()
+
+
+def _read_3dfaces_ascii(dxf_path):
+    if is_binary_dxf(dxf_path):
+        return None
+    corner_blocks = []
+    entity_types = set()
+    for corners, types in _iter_3dface_chunks(dxf_path):
+        corner_blocks.append(corners)
+        entity_types |= types
+    return np.concatenate(corner_blocks) if corner_blocks else np.empty((0, 4, 3)), entity_types
+
+
+def _mesh_from_builder(builder):
+    vertices = np.array([tuple(v) for v in builder.vertices], dtype=np.float64)
+    faces = [face for face in builder.faces if len(face) >= 3]
+    counts = [len(face) for face in faces]
+    indices = np.fromiter((i for face in faces for i in face), dtype=np.int64, count=sum(counts))
+    return MeshData(vertices, fan_triangulate(indices, counts))
+
+
+def _exploded(entities, in_block=False):
+    # (entity, in_block) with block references replaced by their
+    # transformed contents
+    for entity in entities:
+        if entity.dxftype() == "INSERT":
+            yield from _exploded(entity.virtual_entities(), True)
+        else:
+            yield entity, in_block
+
+
+def _read_entities_ezdxf(dxf_path, include_3dfaces):
+    # ezdxf is only needed for MESH/POLYLINE entities and binary files, and
+    # is imported on first use
+    import ezdxf
+    from ezdxf.render import MeshBuilder
+
+    msp = ezdxf.readfile(dxf_path).modelspace()
+    coords = []
+    meshes = []
+    for entity, in_block in _exploded(msp.query("3DFACE MESH POLYLINE INSERT")):
+        kind = entity.dxftype()
+        if kind == "3DFACE":
+            # the ASCII scan only sees 3DFACEs placed directly in ENTITIES
+            if include_3dfaces or in_block:
+                dxf = entity.dxf
+                coords.extend((*dxf.vtx0, *dxf.vtx1, *dxf.vtx2, *dxf.get("vtx3", dxf.vtx2)))
+        elif kind == "MESH":
+            meshes.append(_mesh_from_builder(MeshBuilder.from_mesh(entity)))
+        elif entity.is_poly_face_mesh or entity.is_polygon_mesh:
+            meshes.append(_mesh_from_builder(MeshBuilder.from_polyface(entity)))
+    return np.array(coords, dtype=np.float64).reshape(-1, 4, 3), meshes
+
+
+def read_dxf(dxf_path, weld_tolerance=0.0):
+    scanned = None
+    try:
+        scanned = _read_3dfaces_ascii(dxf_path)
+    except (ValueError, IndexError):
+        pass
+
+    if scanned is None:
+        corners, meshes = _read_entities_ezdxf(dxf_path, include_3dfaces=True)
+    else:
+        corners, entity_types = scanned
+        meshes = []
+        if entity_types & {b"MESH", b"POLYLINE", b"INSERT"}:
+            block_corners, meshes = _read_entities_ezdxf(dxf_path, include_3dfaces=False)
+            corners = np.concatenate([corners, block_corners])
+
+    triangles = quads_to_triangles(corners)
+    soup = MeshData(triangles.reshape(-1, 3), np.arange(3 * len(triangles)).reshape(-1, 3))
+    merged = concatenate_meshes([soup] + meshes, name=os.path.basename(dxf_path), track_parts=False)
+    if weld_tolerance is not None:
+        merged = weld_vertices(merged, weld_tolerance)
+    return merged
+
+
+def iter_dxf_chunks(dxf_path, chunk_bytes=DXF_CHUNK_BYTES):
+    name = os.path.basename(dxf_path)
+    if is_binary_dxf(dxf_path):
+        yield read_dxf(dxf_path)
+        return
+    entity_types = set()
+    for corners, types in _iter_3dface_chunks(dxf_path, chunk_bytes):
+        entity_types |= types
+        yield mesh_from_triangles(quads_to_triangles(corners), name)
+    if entity_types & {b"MESH", b"POLYLINE", b"INSERT"}:
+        # ezdxf loads the whole drawing, so these entities are not chunked
+        corners, meshes = _read_entities_ezdxf(dxf_path, include_3dfaces=False)
+        if len(corners):
+            yield mesh_from_triangles(quads_to_triangles(corners), name)
+        for mesh_data in meshes:
+            mesh_data.name = name
+            yield mesh_data
+
+
+def dxf_layer_name(name):
+    return re.sub(r"[^A-Za-z0-9_$-]", "_", os.path.splitext(name or "")[0])[:31] or "0"
+
+
+def write_dxf_meshes(mesh_data, out_path):
+    import ezdxf
+
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for part in mesh_data.iter_parts():
+        layer = dxf_layer_name(part.name)
+        if layer not in doc.layers:
+            doc.layers.add(layer)
+        entity = msp.add_mesh(dxfattribs={"layer": layer})
+        with entity.edit_data() as data:
+            data.vertices = part.vertices.tolist()
+            data.faces = part.faces.tolist()
+    doc.saveas(out_path)
+
+
+def _polyface_blocks(part):
+    if part.n_vertices <= DXF_POLYFACE_LIMIT and part.n_faces <= DXF_POLYFACE_LIMIT:
+        yield part.vertices, part.faces
+        return
+    step = DXF_POLYFACE_LIMIT // 3
+    for start in range(0, part.n_faces, step):
+        used, local = np.unique(part.faces[start:start + step], return_inverse=True)
+        yield part.vertices[used], local.reshape(-1, 3)
+
+
+def write_polyface(fh, vertices, faces, layer="0", precision=9, chunk_rows=OBJ_WRITE_ROWS):
+    fh.write((
+        f"  0\nPOLYLINE\n  8\n{layer}\n 66\n1\n 10\n0.0\n 20\n0.0\n 30\n0.0\n"
+        f" 70\n64\n 71\n{len(vertices)}\n 72\n{len(faces)}\n"
+    ).encode("ascii"))
+    write_rows(
+        fh,
+        f"  0\nVERTEX\n  8\n{layer}\n 10\n%.{precision}g\n 20\n%.{precision}g\n 30\n%.{precision}g\n 70\n192\n",
+        vertices, chunk_rows,
+    )
+    write_rows(
+        fh,
+        f"  0\nVERTEX\n  8\n{layer}\n 10\n0.0\n 20\n0.0\n 30\n0.0\n 70\n128\n 71\n%d\n 72\n%d\n 73\n%d\n",
+        faces.astype(np.int64) + 1, chunk_rows,
+    )
+    fh.write(f"  0\nSEQEND\n  8\n{layer}\n".encode("ascii"))
+
+
+def write_3dfaces(fh, triangles, layer="0", precision=9, chunk_rows=OBJ_WRITE_ROWS):
+    # the fourth corner repeats the third
+    corners = np.asarray(triangles, dtype=np.float64)[:, [0, 1, 2, 2]]
+    coord = f"%.{precision}g"
+    fmt = f"  0\n3DFACE\n  8\n{layer}\n" + "".join(
+        f"{10 * axis + corner:3d}\n{coord}\n" for corner in range(4) for axis in (1, 2, 3)
+    )
+    write_rows(fh, fmt, corners.reshape(-1, 12), chunk_rows)
+
+
+def _write_entities(fh, mesh_data, layer, mode, precision):
+    if mode == "3dface":
+        write_3dfaces(fh, mesh_data.triangles(), layer, precision)
+    else:
+        for vertices, faces in _polyface_blocks(mesh_data):
+            write_polyface(fh, vertices, faces, layer, precision)
+
+
+class DxfStreamWriter:
+    # Minimal R12 file (ENTITIES section only), written record by record
+    # so memory stays bounded by the formatting chunk.
+    def __init__(self, out_path, mode="polyface", precision=9):
+        if mode not in ("polyface", "3dface"):
+            raise ValueError(f"DXF output mode cannot be streamed: {mode}")
+        self.mode = mode
+        self.precision = precision
+        self.n_faces = 0
+        self.fh = open(out_path, "wb")
+        self.fh.write(b"  0\nSECTION\n  2\nENTITIES\n")
+
+    def write(self, mesh_data, name=None):
+        _write_entities(self.fh, mesh_data, dxf_layer_name(name), self.mode, self.precision)
+        self.n_faces += mesh_data.n_faces
+
+    def close(self):
+        self.fh.write(b"  0\nENDSEC\n  0\nEOF\n")
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_dxf_polyfaces(mesh_data, out_path, precision=9):
+    with DxfStreamWriter(out_path, "polyface", precision) as writer:
+        for part in mesh_data.iter_parts():
+            writer.write(part, part.name)
+
+
+def _block_name(name, index):
+    return f"{dxf_layer_name(name)[:24]}_{index}"
+
+
+def write_dxf_instances(prototypes, instances, out_path, mode="polyface", precision=9):
+    # Each prototype is written once as a block on layer 0, so its entities
+    # take the layer of every INSERT that places it.
+    names = [_block_name(p.name, i) for i, p in enumerate(prototypes)]
+    if mode == "mesh":
+        import ezdxf
+
+        doc = ezdxf.new("R2010")
+        for name, prototype in zip(names, prototypes):
+            entity = doc.blocks.new(name=name).add_mesh()
+            with entity.edit_data() as data:
+                data.vertices = prototype.vertices.tolist()
+                data.faces = prototype.faces.tolist()
+        msp = doc.modelspace()
+        for instance in instances:
+            layer = dxf_layer_name(instance.name)
+            if layer not in doc.layers:
+                doc.layers.add(layer)
+            msp.add_blockref(names[instance.prototype], instance.translation.tolist(), dxfattribs={"layer": layer})
+        doc.saveas(out_path)
+        return
+    if mode not in ("polyface", "3dface"):
+        raise ValueError(f"Unknown DXF output mode: {mode}")
+
+    coord = f"%.{precision}g"
+    with open(out_path, "wb") as fh:
+        fh.write(b"  0\nSECTION\n  2\nBLOCKS\n")
+        for name, prototype in zip(names, prototypes):
+            fh.write((
+                f"  0\nBLOCK\n  8\n0\n  2\n{name}\n 70\n0\n 10\n0.0\n 20\n0.0\n 30\n0.0\n  3\n{name}\n"
+            ).encode("ascii"))
+            _write_entities(fh, prototype, "0", mode, precision)
+            fh.write(b"  0\nENDBLK\n  8\n0\n")
+        fh.write(b"  0\nENDSEC\n  0\nSECTION\n  2\nENTITIES\n")
+        for instance in instances:
+            x, y, z = (coord % v for v in instance.translation)
+            fh.write((
+                f"  0\nINSERT\n  8\n{dxf_layer_name(instance.name)}\n  2\n{names[instance.prototype]}\n"
+                f" 10\n{x}\n 20\n{y}\n 30\n{z}\n"
+            ).encode("ascii"))
+        fh.write(b"  0\nENDSEC\n  0\nEOF\n")
@@ -0,0 +1,287 @@
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+from .meshdata import MeshData, concatenate_meshes
+
+# Binary glTF 2.0: a 12-byte header, a JSON chunk describing nodes, meshes
+# and typed views into the buffer, and a BIN chunk holding the buffer.
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+GLB_HEADER = struct.Struct("<4sII")  # magic, version, total length
+GLB_CHUNK = struct.Struct("<I4s")  # chunk length, chunk type
+GLB_ALIGN = 4
+# side file holding the binary chunk of a streamed write until close
+GLB_SPOOL_SUFFIX = ".bin-spool"
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+COMPONENT_TYPES = {5120: "i1", 5121: "u1", 5122: "<i2", 5123: "<u2", 5125: "<u4", 5126: "<f4"}
+COMPONENT_CODES = {np.dtype(v).str: k for k, v in COMPONENT_TYPES.items()}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
+
+# Quantized positions are stored as unsigned integers spanning the part's
+# bounding box; the node's scale and translation map them back
+# (KHR_mesh_quantization). Index values must stay below the type's
+# maximum, which glTF reserves.
+POSITION_BITS = (8, 16)
+
+
+def _index_dtype(n_vertices, narrow):
+    if narrow and n_vertices < 0xFF:
+        return np.dtype("u1")
+    if narrow and n_vertices < 0xFFFF:
+        return np.dtype("<u2")
+    return np.dtype("<u4")
+
+
+def _encode_positions(vertices, position_bits):
+    # (position array, accessor min, max, node translation and scale)
+    lo, hi = (np.stack([vertices.min(axis=0), vertices.max(axis=0)]).astype(np.float64)
+              if len(vertices) else np.zeros((2, 3)))
+    if position_bits is None:
+        positions = vertices.astype("<f4")
+        return positions, positions.min(axis=0).tolist(), positions.max(axis=0).tolist(), None, None
+    levels = (1 << position_bits) - 1
+    scale = (hi - lo) / levels
+    scale[scale == 0] = 1.0
+    # vertex attributes are 4-byte aligned, so each vertex gets a padding component
+    positions = np.zeros((len(vertices), 4), dtype="u1" if position_bits == 8 else "<u2")
+    positions[:, :3] = np.rint((vertices - lo) / scale)
+    quantized = positions[:, :3]
+    return positions, quantized.min(axis=0).tolist(), quantized.max(axis=0).tolist(), lo, scale
+
+
+class GlbStreamWriter:
+    # Each part becomes one mesh with one indexed triangle primitive and a
+    # node placing it. The JSON has to come before the buffer, so buffer
+    # data is spooled to a side file when streaming and copied in on close;
+    # otherwise the arrays are kept and written straight to the output.
+    def __init__(self, out_path, position_bits=None, narrow_indices=True, spool=True):
+        if position_bits is not None and position_bits not in POSITION_BITS:
+            raise ValueError(f"Unsupported position quantization: {position_bits} bits")
+        self.out_path = out_path
+        self.position_bits = position_bits
+        self.narrow_indices = narrow_indices
+        self.spool_path = out_path + GLB_SPOOL_SUFFIX if spool else None
+        self.fh = open(self.spool_path, "wb+") if spool else None
+        self.arrays = []
+        self.length = 0
+        self.n_faces = 0
+        self.doc = {
+            "asset": {"version": "2.0", "generator": "CADConverter"},
+            "scene": 0, "scenes": [{"nodes": []}], "nodes": [], "meshes": [],
+            "accessors": [], "bufferViews": [],
+        }
+
+    def _add_view(self, array, target, stride=None):
+        padding = -self.length % GLB_ALIGN
+        if padding:
+            self._append(np.zeros(padding, dtype="u1"))
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": array.nbytes, "target": target}
+        if stride is not None:
+            view["byteStride"] = stride
+        self.doc["bufferViews"].append(view)
+        self._append(array)
+        return len(self.doc["bufferViews"]) - 1
+
+    def _append(self, array):
+        array = np.ascontiguousarray(array)
+        if self.fh is not None:
+            array.tofile(self.fh)
+        else:
+            self.arrays.append(array)
+        self.length += array.nbytes
+
+    def _add_accessor(self, view, dtype, count, kind, **fields):
+        self.doc["accessors"].append({
+            "bufferView": view, "componentType": COMPONENT_CODES[np.dtype(dtype).str],
+            "count": count, "type": kind, **fields,
+        })
+        return len(self.doc["accessors"]) - 1
+
+    def add_mesh(self, mesh_data, name=None):
+        # returns the mesh index and the node transform its positions need,
+        # or None for a part without faces, which glTF cannot hold
+        if not mesh_data.n_faces:
+            return None, None
+        positions, lo, hi, translation, scale = _encode_positions(mesh_data.vertices, self.position_bits)
+        stride = positions.itemsize * positions.shape[1] if positions.shape[1] == 4 else None
+        position_view = self._add_view(positions, ARRAY_BUFFER, stride)
+        position = self._add_accessor(position_view, positions.dtype, len(positions), "VEC3", min=lo, max=hi)
+        indices = mesh_data.faces.astype(_index_dtype(mesh_data.n_vertices, self.narrow_indices)).ravel()
+        index_view = self._add_view(indices, ELEMENT_ARRAY_BUFFER)
+        index = self._add_accessor(index_view, indices.dtype, len(indices), "SCALAR")
+        self.doc["meshes"].append({
+            "name": name if name is not None else mesh_data.name or "",
+            "primitives": [{"attributes": {"POSITION": position}, "indices": index, "mode": TRIANGLES}],
+        })
+        self.n_faces += mesh_data.n_faces
+        return len(self.doc["meshes"]) - 1, (translation, scale)
+
+    def add_node(self, mesh, transform, name=None, translation=None):
+        node = {"mesh": mesh}
+        if name:
+            node["name"] = name
+        offset, scale = transform
+        if translation is not None and np.any(translation):
+            offset = translation if offset is None else offset + translation
+        if offset is not None:
+            node["translation"] = np.asarray(offset, dtype=np.float64).tolist()
+        if scale is not None:
+            node["scale"] = scale.tolist()
+        self.doc["scenes"][0]["nodes"].append(len(self.doc["nodes"]))
+        self.doc["nodes"].append(node)
+
+    def write(self, mesh_data, name=None):
+        name = name if name is not None else mesh_data.name
+        mesh, transform = self.add_mesh(mesh_data, name)
+        if mesh is not None:
+            self.add_node(mesh, transform, name)
+
+    def close(self):
+        if self.position_bits is not None:
+            self.doc["extensionsUsed"] = self.doc["extensionsRequired"] = ["KHR_mesh_quantization"]
+        padding = -self.length % GLB_ALIGN
+        if self.length:
+            self.doc["buffers"] = [{"byteLength": self.length + padding}]
+        text = json.dumps(self.doc, separators=(",", ":")).encode("utf-8")
+        text += b" " * (-len(text) % GLB_ALIGN)
+        total = GLB_HEADER.size + GLB_CHUNK.size + len(text)
+        if self.length:
+            total += GLB_CHUNK.size + self.length + padding
+        try:
+            with open(self.out_path, "wb") as out:
+                out.write(GLB_HEADER.pack(GLB_MAGIC, GLB_VERSION, total))
+                out.write(GLB_CHUNK.pack(len(text), b"JSON"))
+                out.write(text)
+                if self.length:
+                    out.write(GLB_CHUNK.pack(self.length + padding, b"BIN\x00"))
+                    if self.fh is not None:
+                        self.fh.seek(0)
+                        shutil.copyfileobj(self.fh, out, 1 << 20)
+                    for array in self.arrays:
+                        array.tofile(out)
+                    out.write(bytes(padding))
+        finally:
+            if self.fh is not None:
+                self.fh.close()
+                os.remove(self.spool_path)
+            self.arrays = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_glb(mesh_data, out_path, position_bits=None, narrow_indices=True):
+    with GlbStreamWriter(out_path, position_bits, narrow_indices, spool=False) as writer:
+        for part in mesh_data.iter_parts():
+            writer.write(part, part.name)
+
+
+def write_glb_instances(prototypes, instances, out_path, position_bits=None, narrow_indices=True):
+    # one mesh per prototype, one node per placed copy
+    with GlbStreamWriter(out_path, position_bits, narrow_indices, spool=False) as writer:
+        meshes = [writer.add_mesh(prototype) for prototype in prototypes]
+        for instance in instances:
+            mesh, transform = meshes[instance.prototype]
+            if mesh is not None:
+                writer.add_node(mesh, transform, instance.name, instance.translation)
+
+
+def _node_matrix(node):
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.asarray(node.get("scale", (1.0, 1.0, 1.0)))
+    matrix[:3, 3] = node.get("translation", (0.0, 0.0, 0.0))
+    return matrix
+
+
+class GlbFile:
+    # Reads the JSON chunk and maps the BIN chunk; accessors are read as
+    # views into it. Only embedded buffers are supported.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            header = fh.read(GLB_HEADER.size)
+            if len(header) < GLB_HEADER.size:
+                raise ValueError(f"Not a GLB file: {path}")
+            magic, version, _ = GLB_HEADER.unpack(header)
+            if magic != GLB_MAGIC or version != GLB_VERSION:
+                raise ValueError(f"Not a glTF 2.0 binary file: {path}")
+            length, kind = GLB_CHUNK.unpack(fh.read(GLB_CHUNK.size))
+            if kind != b"JSON":
+                raise ValueError(f"Missing JSON chunk: {path}")
+            self.doc = json.loads(fh.read(length))
+            chunk = fh.read(GLB_CHUNK.size)
+            self.bin_offset = fh.tell() if len(chunk) == GLB_CHUNK.size else None
+        for buffer in self.doc.get("buffers", []):
+            if "uri" in buffer:
+                raise ValueError(f"External glTF buffers are not supported: {path}")
+        self.data = np.memmap(path, dtype="u1", mode="r") if self.bin_offset is not None else None
+
+    def accessor(self, index):
+        accessor = self.doc["accessors"][index]
+        if "sparse" in accessor or "bufferView" not in accessor:
+            raise ValueError(f"Sparse glTF accessors are not supported: {self.path}")
+        view = self.doc["bufferViews"][accessor["bufferView"]]
+        dtype = np.dtype(COMPONENT_TYPES[accessor["componentType"]])
+        width = TYPE_SIZES[accessor["type"]]
+        count = accessor["count"]
+        stride = view.get("byteStride") or dtype.itemsize * width
+        offset = self.bin_offset + view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+        if not count:
+            return np.empty((0, width), dtype=dtype)
+        values = np.ndarray((count, width), dtype=dtype, buffer=self.data, offset=offset,
+                            strides=(stride, dtype.itemsize))
+        if accessor.get("normalized"):
+            values = values / float(np.iinfo(dtype).max)
+        return values
+
+    def iter_meshes(self):
+        # every triangle primitive of the default scene, in world coordinates
+        nodes = self.doc.get("nodes", [])
+        scene = self.doc.get("scenes", [{}])[self.doc.get("scene", 0)] if self.doc.get("scenes") else {}
+        stack = [(i, np.eye(4)) for i in reversed(scene.get("nodes", range(len(nodes))))]
+        while stack:
+            index, parent = stack.pop()
+            node = nodes[index]
+            matrix = parent @ _node_matrix(node)
+            if "mesh" in node:
+                mesh = self.doc["meshes"][node["mesh"]]
+                name = node.get("name") or mesh.get("name")
+                for primitive in mesh["primitives"]:
+                    if primitive.get("mode", TRIANGLES) != TRIANGLES:
+                        continue
+                    vertices = self.accessor(primitive["attributes"]["POSITION"]).astype(np.float64)
+                    vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+                    if "indices" in primitive:
+                        faces = self.accessor(primitive["indices"]).reshape(-1, 3)
+                    else:
+                        faces = np.arange(len(vertices)).reshape(-1, 3)
+                    yield MeshData(vertices, faces, name)
+            stack.extend((child, matrix) for child in reversed(node.get("children", [])))
+
+
+def read_glb(glb_path):
+    return concatenate_meshes(GlbFile(glb_path).iter_meshes(), name=os.path.basename(glb_path))
+
+
+def iter_glb_chunks(glb_path, chunk_bytes=None):
+    # one chunk per placed primitive
+    yield from GlbFile(glb_path).iter_meshes()
@@ -1,22 +1,76 @@
 # src/gui.py
 
+import multiprocessing
+import os
+import queue
+import sys
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import os
-from converters import merge_files_to_step, merge_files_to_mesh
 
-root = tk.Tk()
-root.title("Multi-CAD Converter")
-root.geometry("650x450")
+if __package__:
+    from .instrument import QueueSink
+else:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.instrument import QueueSink
+
+POLL_MS = 100
+# a cancelled worker stops at its next stage; one that has not exited by
+# then is terminated
+CANCEL_GRACE_S = 10
+# stages that finish reading one input file
+INPUT_STAGES = ("load", "stream", "step_xcaf_read")
 
 file_list = []
+jobs = []
+running = None
+# a fresh interpreter per job rather than a fork of the Tk process
+_context = multiprocessing.get_context("spawn")
+progress_queue = None
+
+
+def remove_partial_output(output, since):
+    # a half-written output is worse than none, and a streamed GLB leaves
+    # its spool file beside it
+    if __package__:
+        from .glbio import GLB_SPOOL_SUFFIX
+    else:
+        from src.glbio import GLB_SPOOL_SUFFIX
+    for path in (output, output + GLB_SPOOL_SUFFIX):
+        try:
+            if os.path.getmtime(path) >= since:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def run_in_background(job_id, job, progress, cancel):
+    # Runs in the worker process. Stage records and then the job summary
+    # are sent back; records carry "stage", the summary "status". Setting
+    # cancel stops the job at its next stage.
+    if __package__:
+        from .cli import run_job
+    else:
+        from src.cli import run_job
+    started = time.time()
+    try:
+        summary = run_job(job, sinks=[QueueSink(progress, job_id)], cancel=cancel)
+    finally:
+        if cancel.is_set():
+            remove_partial_output(job["output"], started)
+    progress.put((job_id, summary))
+
 
 def select_files():
-    chosen = filedialog.askopenfilenames(filetypes=[("3D Files", "*.stl;*.obj;*.dxf;*.step")])
+    chosen = filedialog.askopenfilenames(filetypes=[("3D Files", "*.stl;*.obj;*.dxf;*.cmb;*.glb;*.step")])
     for f in chosen:
         file_list.append(f)
         listbox_files.insert(tk.END, os.path.basename(f))
 
+def clear_files():
+    file_list.clear()
+    listbox_files.delete(0, tk.END)
+
 def convert_and_merge():
     if not file_list:
         messagebox.showwarning("No Files", "Please select files first!")
@@ -29,127 +83,209 @@ def convert_and_merge():
     if not save_path:
         return
 
-    try:
-        if out_format == "step":
-            merge_files_to_step(file_list, save_path)
+    jobs.append({
+        "id": len(jobs), "inputs": list(file_list), "output": save_path, "format": out_format,
+        "status": "queued", "detail": "",
+    })
+    listbox_jobs.insert(tk.END, "")
+    refresh_job(jobs[-1])
+    start_next_job()
+
+def refresh_job(job):
+    text = f"{os.path.basename(job['output'])} ({len(job['inputs'])} files): {job['status']}"
+    if job["detail"]:
+        text += f" - {job['detail']}"
+    listbox_jobs.delete(job["id"])
+    listbox_jobs.insert(job["id"], text)
+
+def start_next_job():
+    global running
+    if running is not None:
+        return
+    job = next((j for j in jobs if j["status"] == "queued"), None)
+    if job is None:
+        return
+    spec = {"inputs": job["inputs"], "output": job["output"], "format": job["format"]}
+    cancel = _context.Event()
+    process = _context.Process(target=run_in_background, args=(job["id"], spec, progress_queue, cancel),
+                               daemon=True)
+    process.start()
+    total_bytes = 0
+    for fpath in job["inputs"]:
+        try:
+            total_bytes += os.path.getsize(fpath)
+        except OSError:
+            pass
+    running = {
+        "job": job, "process": process, "cancel": cancel, "cancelled_at": None, "start": time.time(),
+        "total_bytes": total_bytes, "bytes_read": 0, "files_done": 0, "triangles": 0,
+    }
+    job["status"] = "running"
+    refresh_job(job)
+    progress_bar["value"] = 0
+    label_stage.config(text="starting worker...")
+    label_eta.config(text="")
+
+def show_progress(record):
+    job = running["job"]
+    if record["stage"] in INPUT_STAGES:
+        running["files_done"] += 1
+        running["bytes_read"] += record.get("bytes_read", 0)
+        running["triangles"] += record.get("triangles", 0)
+    words = [record["stage"], record.get("file"), f"{record.get('triangles', 0):,} triangles",
+             f"in {record['wall_s']:.2f}s"]
+    label_stage.config(text=" ".join(w for w in words if w))
+
+    # inputs are read in order, so bytes read so far drive the estimate
+    elapsed = time.time() - running["start"]
+    fraction = running["bytes_read"] / running["total_bytes"] if running["total_bytes"] else 0.0
+    progress_bar["value"] = 100 * fraction
+    eta = f"ETA {elapsed * (1 - fraction) / fraction:.0f}s" if 0 < fraction < 1 else ""
+    label_eta.config(text=(
+        f"{running['files_done']}/{len(job['inputs'])} files, {running['bytes_read'] / 1e6:.1f} MB read, "
+        f"{running['triangles']:,} triangles, {elapsed:.0f}s elapsed {eta}"
+    ))
+    job["detail"] = f"{running['files_done']}/{len(job['inputs'])} files"
+    refresh_job(job)
+
+def finish_job(status, detail):
+    global running
+    job = running["job"]
+    job["status"] = status
+    job["detail"] = detail
+    refresh_job(job)
+    running["process"].join(timeout=1)
+    running = None
+    progress_bar["value"] = 100 if status == "ok" else 0
+    label_stage.config(text="")
+    label_eta.config(text="")
+    start_next_job()
+
+def poll_progress():
+    # Checked before draining, so a worker that exited after sending its
+    # summary is not mistaken for a crash.
+    alive = running is not None and running["process"].is_alive()
+    while running is not None:
+        try:
+            job_id, message = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        if job_id != running["job"]["id"]:
+            continue
+        if "stage" in message:
+            show_progress(message)
+        elif message["status"] == "failed":
+            finish_job("failed", message["error"])
         else:
-            merge_files_to_mesh(file_list, save_path, out_format)
-        messagebox.showinfo("Success", f"✅ File saved: {save_path}")
-    except Exception as ex:
-        messagebox.showerror("Error", str(ex))
-
-label_title = tk.Label(root, text="Select 3D Files to Merge", font=("Arial", 14))
-label_title.pack(pady=10)
-
-listbox_files = tk.Listbox(root, width=60, height=10)
-listbox_files.pack(pady=5)
-
-btn_select = tk.Button(root, text="Select Files", command=select_files, font=("Arial", 12))
-btn_select.pack(pady=5)
-
-frame_out = tk.Frame(root)
-frame_out.pack()
-
-label_format = tk.Label(frame_out, text="Output Format:", font=("Arial", 12))
-label_format.pack(side=tk.LEFT, padx=5)
-
-combo_format = ttk.Combobox(frame_out, values=["step", "stl", "obj", "dxf"], width=6)
-combo_format.set("step")
-combo_format.pack(side=tk.LEFT)
-
-btn_convert = tk.Button(root, text="Convert & Merge", command=convert_and_merge, font=("Arial", 12))
-btn_convert.pack(pady=20)
-
-root.mainloop()
-
-
-
-Commented Code:
+            failed = len(message["failures"])
+            detail = f"{message['seconds']:.1f}s" + (f", {failed} files failed" if failed else "")
+            finish_job(message["status"], detail)
+    if running is not None and not alive:
+        if running["cancelled_at"] is not None:
+            finish_job("cancelled", "")
+        else:
+            finish_job("failed", f"worker exited with code {running['process'].exitcode}")
+    elif running is not None and running["cancelled_at"] is not None:
+        if time.time() - running["cancelled_at"] > CANCEL_GRACE_S:
+            terminate_worker()
+            finish_job("cancelled", "worker terminated")
+    root.after(POLL_MS, poll_progress)
+
+def terminate_worker():
+    # The last resort for a worker stuck in one long stage. A process
+    # killed while writing to the progress queue can leave it corrupt, so
+    # later jobs get a new one.
+    global progress_queue
+    process = running["process"]
+    process.terminate()
+    process.join(timeout=2)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    remove_partial_output(running["job"]["output"], running["start"])
+    progress_queue = _context.Queue()
+
+def cancel_job():
+    # Cancels the selected queued job, or the running one. The running
+    # worker is asked to stop and cleans up after itself; poll_progress
+    # finishes the job when it exits.
+    selection = listbox_jobs.curselection()
+    if selection and jobs[selection[0]]["status"] == "queued":
+        jobs[selection[0]]["status"] = "cancelled"
+        refresh_job(jobs[selection[0]])
+        return
+    if running is None or running["cancelled_at"] is not None:
+        return
+    running["cancel"].set()
+    running["cancelled_at"] = time.time()
+    running["job"]["status"] = "cancelling"
+    refresh_job(running["job"])
+    label_stage.config(text="cancelling...")
 
-# src/gui.py
+def main():
+    global root, listbox_files, combo_format, listbox_jobs, progress_bar, label_stage, label_eta, progress_queue
 
-import tkinter as tk  # Standard GUI toolkit
-from tkinter import filedialog, messagebox, ttk  # Common widgets and dialogs
-import os  # For file path operations
-from converters import merge_files_to_step, merge_files_to_mesh  # Custom functions to merge and convert CAD files
+    progress_queue = _context.Queue()
+    root = tk.Tk()
+    root.title("Multi-CAD Converter")
+    root.geometry("650x650")
 
-# Initialize the main GUI window
-root = tk.Tk()
-root.title("Multi-CAD Converter")  # Set window title
-root.geometry("650x450")  # Set window size
+    label_title = tk.Label(root, text="Select 3D Files to Merge", font=("Arial", 14))
+    label_title.pack(pady=10)
 
-file_list = []  # List to store paths of selected 3D files
+    listbox_files = tk.Listbox(root, width=60, height=10)
+    listbox_files.pack(pady=5)
 
-# Function to handle file selection
-def select_files():
-    # Open file dialog to choose multiple 3D files of supported formats
-    chosen = filedialog.askopenfilenames(filetypes=[("3D Files", "*.stl;*.obj;*.dxf;*.step")])
-    for f in chosen:
-        file_list.append(f)  # Add selected file to internal list
-        listbox_files.insert(tk.END, os.path.basename(f))  # Display filename in listbox
+    frame_files = tk.Frame(root)
+    frame_files.pack(pady=5)
 
-# Function to merge and convert selected files to the chosen output format
-def convert_and_merge():
-    if not file_list:
-        messagebox.showwarning("No Files", "Please select files first!")  # Alert if no files selected
-        return
+    btn_select = tk.Button(frame_files, text="Select Files", command=select_files, font=("Arial", 12))
+    btn_select.pack(side=tk.LEFT, padx=5)
 
-    out_format = combo_format.get().lower()  # Get output format selected in combo box
-    out_ext = "." + out_format  # Format extension (e.g., .step)
+    btn_clear = tk.Button(frame_files, text="Clear", command=clear_files, font=("Arial", 12))
+    btn_clear.pack(side=tk.LEFT, padx=5)
 
-    # Prompt user to choose save path for merged file
-    save_path = filedialog.asksaveasfilename(
-        defaultextension=out_ext,
-        filetypes=[(f"{out_format.upper()} Files", f"*{out_ext}")]
-    )
-    if not save_path:
-        return  # Cancel if user didn't provide a path
+    frame_out = tk.Frame(root)
+    frame_out.pack()
 
-    try:
-        # Call appropriate merge function based on format
-        if out_format == "step":
-            merge_files_to_step(file_list, save_path)
-        else:
-            merge_files_to_mesh(file_list, save_path, out_format)
+    label_format = tk.Label(frame_out, text="Output Format:", font=("Arial", 12))
+    label_format.pack(side=tk.LEFT, padx=5)
 
-        # Notify user of success
-        messagebox.showinfo("Success", f"✅ File saved: {save_path}")
-    except Exception as ex:
-        # Show any error that occurs during conversion
-        messagebox.showerror("Error", str(ex))
+    combo_format = ttk.Combobox(frame_out, values=["step", "stl", "obj", "dxf", "cmb", "glb"], width=6)
+    combo_format.set("step")
+    combo_format.pack(side=tk.LEFT)
 
-# --- GUI Layout Section ---
+    btn_convert = tk.Button(root, text="Convert & Merge", command=convert_and_merge, font=("Arial", 12))
+    btn_convert.pack(pady=15)
 
-# Title label
-label_title = tk.Label(root, text="Select 3D Files to Merge", font=("Arial", 14))
-label_title.pack(pady=10)
+    label_jobs = tk.Label(root, text="Jobs", font=("Arial", 12))
+    label_jobs.pack()
 
-# Listbox to show selected files
-listbox_files = tk.Listbox(root, width=60, height=10)
-listbox_files.pack(pady=5)
+    listbox_jobs = tk.Listbox(root, width=80, height=6)
+    listbox_jobs.pack(pady=5)
 
-# Button to open file selector
-btn_select = tk.Button(root, text="Select Files", command=select_files, font=("Arial", 12))
-btn_select.pack(pady=5)
+    progress_bar = ttk.Progressbar(root, length=500, maximum=100)
+    progress_bar.pack(pady=5)
 
-# Frame to hold output format controls
-frame_out = tk.Frame(root)
-frame_out.pack()
+    label_stage = tk.Label(root, text="", font=("Arial", 10))
+    label_stage.pack()
 
-# Label for output format
-label_format = tk.Label(frame_out, text="Output Format:", font=("Arial", 12))
-label_format.pack(side=tk.LEFT, padx=5)
+    label_eta = tk.Label(root, text="", font=("Arial", 10))
+    label_eta.pack()
 
-# Dropdown combo box for format selection
-combo_format = ttk.Combobox(frame_out, values=["step", "stl", "obj", "dxf"], width=6)
-combo_format.set("step")  # Default selection
-combo_format.pack(side=tk.LEFT)
+    btn_cancel = tk.Button(root, text="Cancel", command=cancel_job, font=("Arial", 12))
+    btn_cancel.pack(pady=10)
 
-# Button to trigger file merge and export
-btn_convert = tk.Button(root, text="Convert & Merge", command=convert_and_merge, font=("Arial", 12))
-btn_convert.pack(pady=20)
+    root.after(POLL_MS, poll_progress)
+    root.mainloop()
 
-# Start the Tkinter main event loop
-root.mainloop()
+    # closing the window stops a running conversion
+    if running is not None:
+        running["cancel"].set()
+        running["process"].join(timeout=CANCEL_GRACE_S)
+        if running["process"].is_alive():
+            terminate_worker()
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from .cmbio import read_cmb, write_cmb
+from .meshdata import MeshData, MeshPart
+
+# 2: the input's part table is stored next to its mesh
+INCREMENTAL_VERSION = 2
+
+
+def default_state_dir(out_path):
+    return out_path + ".incremental"
+
+
+def fingerprint(fpath):
+    stat = os.stat(fpath)
+    return {"path": os.path.abspath(fpath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class IncrementalState:
+    # Keeps each input's loaded mesh from the last run as a .cmb file named
+    # after the input's fingerprint and load parameters, with its part table
+    # (or null) beside it, so an unchanged input is mapped back exactly
+    # instead of reloaded. It is passed where a
+    # MeshCache goes and can wrap one for inputs that did change. Workers
+    # only write part files; the manifest is written by the parent.
+    def __init__(self, state_dir, cache=None):
+        self.state_dir = state_dir
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        # file times come from a coarse clock; the slack keeps files written
+        # right at the start of this run from looking older than it
+        self.started = time.time() - 0.1
+        os.makedirs(os.path.join(state_dir, "parts"), exist_ok=True)
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.state_dir, "manifest.json")
+
+    def _part_path(self, key):
+        return os.path.join(self.state_dir, "parts", key + ".cmb")
+
+    def _table_path(self, key):
+        return os.path.join(self.state_dir, "parts", key + ".parts.json")
+
+    def key(self, fpath, params):
+        return _digest({"version": INCREMENTAL_VERSION, "input": fingerprint(fpath), "params": params})
+
+    def get_or_load(self, fpath, load, params):
+        key = self.key(fpath, params)
+        part_path = self._part_path(key)
+        table_path = self._table_path(key)
+        name = os.path.basename(fpath)
+        if os.path.exists(part_path):
+            self.hits += 1
+            mesh_data = read_cmb(part_path)
+            with open(table_path) as fh:
+                table = json.load(fh)
+            mesh_data.parts = None if table is None else [MeshPart(*p) for p in table]
+            os.utime(part_path)
+            os.utime(table_path)
+        else:
+            self.misses += 1
+            if self.cache is not None:
+                mesh_data = self.cache.get_or_load(fpath, load, params)
+            else:
+                mesh_data = load(fpath)
+            # the table goes first: a part file is only there once both are
+            table = None if mesh_data.parts is None else [list(p) for p in mesh_data.parts]
+            staging = f"{table_path}.tmp-{uuid.uuid4().hex}"
+            with open(staging, "w") as fh:
+                json.dump(table, fh)
+            os.replace(staging, table_path)
+            # stored whole, so vertices no part uses and their order survive
+            staging = f"{part_path}.tmp-{uuid.uuid4().hex}"
+            write_cmb(MeshData(mesh_data.vertices, mesh_data.faces, mesh_data.name), staging)
+            os.replace(staging, part_path)
+        mesh_data.name = name
+        return mesh_data
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("version") == INCREMENTAL_VERSION else None
+
+    def _outputs_record(self, outputs):
+        return [fingerprint(p) if os.path.exists(p) else None for p in outputs]
+
+    def up_to_date(self, inputs, settings, outputs):
+        # True when the last successful run had the same inputs, settings
+        # and outputs, and the outputs have not been touched since.
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        try:
+            current = [fingerprint(p) for p in inputs]
+        except OSError:
+            return False
+        return (manifest["inputs"] == current and manifest["settings"] == _digest(settings)
+                and None not in manifest["outputs"] and manifest["outputs"] == self._outputs_record(outputs))
+
+    def commit(self, inputs, settings, outputs, complete=True):
+        # Part files not used by this run belong to inputs that changed or
+        # went away. A run with failures is recorded without its outputs so
+        # the next one is not skipped.
+        parts_dir = os.path.join(self.state_dir, "parts")
+        for entry in os.scandir(parts_dir):
+            try:
+                if entry.stat().st_mtime < self.started:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+        manifest = {
+            "version": INCREMENTAL_VERSION,
+            "inputs": [fingerprint(p) for p in inputs if os.path.exists(p)],
+            "settings": _digest(settings),
+            "outputs": self._outputs_record(outputs) if complete else [None],
+        }
+        staging = f"{self._manifest_path}.tmp-{uuid.uuid4().hex}"
+        with open(staging, "w") as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(staging, self._manifest_path)
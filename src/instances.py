@@ -0,0 +1,101 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .cache import file_digest
+from .meshdata import MeshData
+
+# One placed copy of a prototype mesh. Copies are matched up to a
+# translation with the same vertex and face order, which is what repeated
+# exports of one part produce.
+Instance = namedtuple("Instance", ["prototype", "name", "translation"])
+
+DEFAULT_INSTANCE_TOLERANCE = 1e-6
+
+
+def duplicate_sources(filepaths):
+    # sources[i] is the index of the first input with the same content as
+    # input i. Only inputs whose size matches another input's are hashed.
+    filepaths = list(filepaths)
+    sizes = {}
+    for i, fpath in enumerate(filepaths):
+        try:
+            sizes.setdefault(os.path.getsize(fpath), []).append(i)
+        except OSError:
+            pass
+
+    sources = list(range(len(filepaths)))
+    for same_size in sizes.values():
+        if len(same_size) < 2:
+            continue
+        first = {}
+        for i in same_size:
+            try:
+                digest = file_digest(filepaths[i])
+            except OSError:
+                continue
+            sources[i] = first.setdefault(digest, i)
+    return sources
+
+
+def geometry_key(mesh_data):
+    # Copies of one part keep its face list and, up to rounding, its size;
+    # a matching key is confirmed by comparing the vertices.
+    lo, hi = mesh_data.bounds().astype(np.float64)
+    digest = hashlib.sha256()
+    digest.update(np.array([mesh_data.n_vertices, mesh_data.n_faces], dtype=np.int64).tobytes())
+    digest.update(mesh_data.faces.tobytes())
+    digest.update(" ".join(f"{e:.3g}" for e in hi - lo).encode("ascii"))
+    return digest.hexdigest(), lo
+
+
+def _same_geometry(a, a_origin, b, b_origin, tolerance):
+    if a.vertices.shape != b.vertices.shape or not np.array_equal(a.faces, b.faces):
+        return False
+    if not len(a.vertices):
+        return True
+    # relative to the part's size, plus the rounding of the coordinates'
+    # own magnitude, which a translated float32 copy carries
+    extent = float((a.vertices.max(axis=0) - a_origin).max())
+    magnitude = max(float(np.abs(a.vertices).max()), float(np.abs(b.vertices).max()))
+    eps = max(np.finfo(a.vertices.dtype).eps, np.finfo(b.vertices.dtype).eps)
+    allowed = tolerance * extent + 4 * eps * magnitude
+    deviation = np.abs((a.vertices - a_origin) - (b.vertices - b_origin)).max()
+    return float(deviation) <= allowed
+
+
+def find_instances(meshes, tolerance=DEFAULT_INSTANCE_TOLERANCE):
+    # Returns (prototypes, instances): one prototype per distinct geometry,
+    # in first-seen order, and one instance per input mesh placing it.
+    # The tolerance is relative to each part's size.
+    prototypes = []
+    origins = []
+    instances = []
+    by_key = {}
+    for mesh_data in meshes:
+        key, origin = geometry_key(mesh_data)
+        candidates = by_key.setdefault(key, [])
+        for index in candidates:
+            if _same_geometry(prototypes[index], origins[index], mesh_data, origin, tolerance):
+                break
+        else:
+            index = len(prototypes)
+            candidates.append(index)
+            prototypes.append(mesh_data)
+            origins.append(origin)
+        instances.append(Instance(index, mesh_data.name, origin - origins[index]))
+    return prototypes, instances
+
+
+def place_instance(prototype, translation, name=None):
+    vertices = prototype.vertices
+    if np.any(translation):
+        vertices = (vertices + translation).astype(vertices.dtype)
+    return MeshData(vertices, prototype.faces, name)
+
+
+def expand_instances(prototypes, instances):
+    for instance in instances:
+        yield place_instance(prototypes[instance.prototype], instance.translation, instance.name)
@@ -0,0 +1,229 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_active = ContextVar("instrumentation", default=None)
+
+
+def _read_status(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_bytes():
+    peak = _read_status("VmHWM:")
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024
+    return peak
+
+
+def _reset_peak_rss():
+    # Linux lets a process restart its own high-water mark
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class JsonLinesSink:
+    def __init__(self, path_or_stream):
+        if isinstance(path_or_stream, str):
+            self.fh = open(path_or_stream, "a")
+            self.owned = True
+        else:
+            self.fh = path_or_stream
+            self.owned = False
+
+    def emit(self, record):
+        self.fh.write(json.dumps(record, sort_keys=True) + "\n")
+        self.fh.flush()
+
+    def close(self):
+        if self.owned:
+            self.fh.close()
+
+
+class PrometheusSink:
+    # Totals per (job, stage) in the text exposition format, rewritten on
+    # close for a node_exporter textfile collector.
+    COUNTERS = {
+        "wall_s": ("cadconvert_stage_wall_seconds_total", "Wall-clock time spent in the stage"),
+        "cpu_s": ("cadconvert_stage_cpu_seconds_total", "CPU time spent in the stage"),
+        "triangles": ("cadconvert_stage_triangles_total", "Triangles handled by the stage"),
+        "vertices": ("cadconvert_stage_vertices_total", "Vertices handled by the stage"),
+        "bytes_read": ("cadconvert_stage_read_bytes_total", "Bytes read by the stage"),
+        "bytes_written": ("cadconvert_stage_written_bytes_total", "Bytes written by the stage"),
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.totals = {}
+
+    def emit(self, record):
+        labels = (record.get("job") or "", record["stage"])
+        totals = self.totals.setdefault(labels, {"runs": 0})
+        totals["runs"] += 1
+        if record.get("peak_rss_bytes") is not None:
+            totals["peak_rss_bytes"] = max(totals.get("peak_rss_bytes", 0), record["peak_rss_bytes"])
+        for field in self.COUNTERS:
+            if field in record:
+                totals[field] = totals.get(field, 0) + record[field]
+
+    def _metric_lines(self, name, help_text, kind, field):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (job, stage), totals in sorted(self.totals.items()):
+            if field in totals:
+                lines.append(f'{name}{{job="{_escape(job)}",stage="{_escape(stage)}"}} {totals[field]}')
+        return lines
+
+    def close(self):
+        lines = self._metric_lines("cadconvert_stage_runs_total", "Times the stage ran", "counter", "runs")
+        for field, (name, help_text) in self.COUNTERS.items():
+            lines += self._metric_lines(name, help_text, "counter", field)
+        lines += self._metric_lines(
+            "cadconvert_stage_peak_rss_bytes", "Highest resident set size seen in the stage", "gauge",
+            "peak_rss_bytes",
+        )
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class QueueSink:
+    # Forwards (job id, record) pairs to another process as each stage
+    # finishes, for live progress.
+    def __init__(self, progress, job_id):
+        self.progress = progress
+        self.job_id = job_id
+
+    def emit(self, record):
+        self.progress.put((self.job_id, record))
+
+    def close(self):
+        pass
+
+
+def open_sink(path):
+    if path.endswith(".prom"):
+        return PrometheusSink(path)
+    return JsonLinesSink(path)
+
+
+class Cancelled(BaseException):
+    # Raised at the start of a stage once the job's cancel event is set. Not
+    # an Exception, so per-file error handling does not swallow it.
+    pass
+
+
+class Instrumentation:
+    def __init__(self, sinks=(), job=None, profile_path=None, cancel=None, reset_peak=False):
+        self.sinks = list(sinks)
+        self.job = job
+        self.profile_path = profile_path
+        self.cancel = cancel
+        self.profiler = cProfile.Profile() if profile_path else None
+        self._open = []
+        # the high-water mark belongs to the whole process, so only a caller
+        # that owns it (a one-shot CLI run) may restart it per stage
+        self._peak_resettable = reset_peak and _reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled(name)
+        record = {"job": self.job, "stage": name, "pid": os.getpid(), **fields}
+        if self._peak_resettable:
+            _reset_peak_rss()
+        self._open.append(0)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        record["start"] = time.time()
+        try:
+            yield record
+        except BaseException as ex:
+            record["error"] = f"{type(ex).__name__}: {ex}"
+            raise
+        finally:
+            record["wall_s"] = round(time.perf_counter() - start_wall, 6)
+            record["cpu_s"] = round(time.process_time() - start_cpu, 6)
+            # a nested stage may have reset the high-water mark since
+            peak = peak_rss_bytes()
+            nested = self._open.pop()
+            if peak is not None:
+                peak = max(peak, nested)
+                record["peak_rss_bytes"] = peak
+                if self._open:
+                    self._open[-1] = max(self._open[-1], peak)
+            self.emit(record)
+
+    def emit(self, record):
+        record.setdefault("job", self.job)
+        for sink in self.sinks:
+            sink.emit(record)
+
+    @contextmanager
+    def activate(self):
+        token = _active.set(self)
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            yield self
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            _active.reset(token)
+
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile_path)
+        for sink in self.sinks:
+            sink.close()
+
+
+def current():
+    return _active.get()
+
+
+@contextmanager
+def stage(name, **fields):
+    # A no-op record when no instrumentation is active for this job.
+    instrumentation = _active.get()
+    if instrumentation is None:
+        yield {}
+        return
+    with instrumentation.stage(name, **fields) as record:
+        yield record
@@ -0,0 +1,299 @@
+from collections import namedtuple
+
+import numpy as np
+
+MeshPart = namedtuple("MeshPart", ["name", "face_start", "face_stop"])
+
+
+class MeshData:
+    __slots__ = ("vertices", "faces", "name", "parts")
+
+    def __init__(self, vertices, faces, name=None, vertex_dtype=None, parts=None):
+        vertices = np.asarray(vertices)
+        if vertex_dtype is None:
+            vertex_dtype = np.float32 if vertices.dtype == np.float32 else np.float64
+        self.vertices = np.ascontiguousarray(vertices, dtype=vertex_dtype).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32).reshape(-1, 3)
+        self.name = name
+        self.parts = parts
+
+    @classmethod
+    def empty(cls, name=None, vertex_dtype=np.float64):
+        return cls(np.empty((0, 3), dtype=vertex_dtype), np.empty((0, 3), dtype=np.int32), name)
+
+    @property
+    def n_vertices(self):
+        return len(self.vertices)
+
+    @property
+    def n_faces(self):
+        return len(self.faces)
+
+    @property
+    def nbytes(self):
+        return self.vertices.nbytes + self.faces.nbytes
+
+    def triangles(self):
+        return self.vertices[self.faces]
+
+    def bounds(self):
+        if not len(self.vertices):
+            return np.zeros((2, 3), dtype=self.vertices.dtype)
+        return np.stack([self.vertices.min(axis=0), self.vertices.max(axis=0)])
+
+    def copy(self):
+        return MeshData(self.vertices.copy(), self.faces.copy(), self.name, parts=self.parts)
+
+    def iter_parts(self):
+        if not self.parts:
+            yield self
+            return
+        for part in self.parts:
+            faces = self.faces[part.face_start:part.face_stop]
+            if not len(faces):
+                yield MeshData.empty(part.name, self.vertices.dtype)
+                continue
+            lo, hi = int(faces.min()), int(faces.max()) + 1
+            local = faces - lo
+            used = np.zeros(hi - lo, dtype=bool)
+            used[local] = True
+            if used.all():
+                yield MeshData(self.vertices[lo:hi], local, part.name)
+                continue
+            # vertices shared across parts (after a weld) are interleaved
+            # with other parts' vertices; keep only this part's own
+            remap = np.cumsum(used) - 1
+            yield MeshData(self.vertices[lo:hi][used], remap[local], part.name)
+
+    def __repr__(self):
+        return (f"MeshData(name={self.name!r}, vertices={self.n_vertices}, "
+                f"faces={self.n_faces}, dtype={self.vertices.dtype})")
+
+
+def concatenate_meshes(meshes, name=None, track_parts=True):
+    meshes = list(meshes)
+    if not meshes:
+        return MeshData.empty(name)
+
+    # One allocation per output array, filled part by part with the index
+    # offset applied in place.
+    vertex_dtype = np.result_type(*[m.vertices.dtype for m in meshes])
+    vertices = np.empty((sum(m.n_vertices for m in meshes), 3), dtype=vertex_dtype)
+    faces = np.empty((sum(m.n_faces for m in meshes), 3), dtype=np.int32)
+    v_start = f_start = 0
+    for m in meshes:
+        vertices[v_start:v_start + m.n_vertices] = m.vertices
+        np.add(m.faces, v_start, out=faces[f_start:f_start + m.n_faces])
+        v_start += m.n_vertices
+        f_start += m.n_faces
+    return MeshData(vertices, faces, name, parts=_concatenated_parts(meshes) if track_parts else None)
+
+
+def _concatenated_parts(meshes):
+    parts = []
+    face_offset = 0
+    for m in meshes:
+        if m.parts:
+            parts.extend(MeshPart(p.name, p.face_start + face_offset, p.face_stop + face_offset)
+                         for p in m.parts)
+        else:
+            parts.append(MeshPart(m.name, face_offset, face_offset + m.n_faces))
+        face_offset += m.n_faces
+    return parts
+
+
+_CELL_BITS = 21
+_CELL_MASK = (1 << _CELL_BITS) - 1
+_NEIGHBOUR_CELLS = [(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)]
+
+
+def _cell_keys(cells):
+    # 21 bits per axis; cells further apart than that wrap around and share
+    # a key, which the distance check in weld_vertices makes harmless.
+    cells = cells & _CELL_MASK
+    return (cells[:, 0] << 2 * _CELL_BITS) | (cells[:, 1] << _CELL_BITS) | cells[:, 2]
+
+
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def _row_hashes(words):
+    words = words.astype(np.uint64)
+    hashes = (words * _HASH_MULTIPLIERS[:words.shape[1]]).sum(axis=1, dtype=np.uint64)
+    hashes ^= hashes >> np.uint64(29)
+    hashes *= np.uint64(0xBF58476D1CE4E5B9)
+    hashes ^= hashes >> np.uint64(32)
+    return hashes
+
+
+def unique_rows(rows):
+    # Linear-time dedupe through an open-addressing hash table, probed for
+    # all pending rows at once: each round every row either finds its
+    # slot's owner equal to itself or moves on to the next slot. Returns
+    # the first index of each distinct row, in order of appearance, and
+    # the inverse mapping. Rows are compared by bit pattern, so a NaN
+    # matches a NaN with the same bits instead of never matching at all.
+    rows = np.ascontiguousarray(rows)
+    n = len(rows)
+    if rows.dtype.kind == "f":
+        rows = rows + rows.dtype.type(0)  # -0.0 -> 0.0
+    rows = rows.view(np.dtype(f"u{rows.dtype.itemsize}"))
+    hashes = _row_hashes(rows)
+
+    size = 1 << max(2 * n - 1, 1).bit_length()
+    table = np.full(size, -1, dtype=np.int64)
+    owner = np.empty(n, dtype=np.int64)
+    pending = np.arange(n)
+    slot = (hashes & np.uint64(size - 1)).astype(np.int64)
+    while len(pending):
+        free = table[slot] < 0
+        # written back to front so the earliest row claims a contested slot
+        table[slot[free][::-1]] = pending[free][::-1]
+        candidate = table[slot]
+        same = (hashes[candidate] == hashes[pending]) & (rows[candidate] == rows[pending]).all(axis=1)
+        owner[pending[same]] = candidate[same]
+        pending = pending[~same]
+        slot = (slot[~same] + 1) & (size - 1)
+
+    first = np.flatnonzero(owner == np.arange(n))
+    rank = np.empty(n, dtype=np.int64)
+    rank[first] = np.arange(len(first))
+    return first, rank[owner]
+
+
+def _spatial_hash_representatives(vertices, tolerance):
+    # Hash every vertex into a grid of cells twice the tolerance wide. A
+    # vertex's tolerance ball reaches at most one neighbour cell per axis,
+    # so every vertex within tolerance of it lies in one of 8 cells. Each
+    # vertex is compared with every vertex of those cells, and the pairs
+    # within tolerance are joined into groups; the result maps each vertex
+    # to the smallest index of its group. Working in key order keeps the
+    # table lookups cache friendly.
+    scaled = vertices / (2.0 * tolerance)
+    cells = np.floor(scaled).astype(np.int64)
+    order = np.argsort(_cell_keys(cells), kind="stable")
+    cells = cells[order]
+    side = np.where(scaled[order] - cells < 0.5, -1, 1)
+    points = vertices[order].astype(np.float64)
+    keys = _cell_keys(cells)
+    first = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.diff(np.append(first, len(keys)))
+    table = keys[first]
+
+    # per axis, the packed key component of the own cell and of the near neighbour
+    components = [
+        [((cells[:, axis] + step) & _CELL_MASK) << (2 - axis) * _CELL_BITS for step in (0, side[:, axis])]
+        for axis in range(3)
+    ]
+
+    n = len(points)
+    pairs_a = []
+    pairs_b = []
+    for x, y, z in _NEIGHBOUR_CELLS:
+        neighbour_keys = components[0][x] | components[1][y] | components[2][z]
+        slot = np.minimum(np.searchsorted(table, neighbour_keys), len(table) - 1)
+        found = table[slot] == neighbour_keys
+        # every (vertex, vertex of the neighbour cell) pair, later index first
+        vertex = np.flatnonzero(found)
+        size = counts[slot[vertex]]
+        a = np.repeat(vertex, size)
+        b = np.arange(len(a)) - np.repeat(np.cumsum(size) - size, size) + np.repeat(first[slot[vertex]], size)
+        keep = b < a
+        a, b = a[keep], b[keep]
+        d = points[a] - points[b]
+        near = np.einsum("ij,ij->i", d, d) <= tolerance * tolerance
+        pairs_a.append(a[near])
+        pairs_b.append(b[near])
+    a = np.concatenate(pairs_a)
+    b = np.concatenate(pairs_b)
+
+    # join the pairs: hook the larger group label onto the smaller, then
+    # shortcut every label to its root, until both ends of each pair agree
+    label = np.arange(n)
+    while len(a):
+        low = np.minimum(label[a], label[b])
+        np.minimum.at(label, label[a], low)
+        np.minimum.at(label, label[b], low)
+        while True:
+            jumped = label[label]
+            if np.array_equal(jumped, label):
+                break
+            label = jumped
+        apart = label[a] != label[b]
+        a, b = a[apart], b[apart]
+
+    representative = np.empty(n, dtype=np.int64)
+    representative[order] = order[label]
+    return representative
+
+
+def weld_vertices(mesh_data, tolerance=0.0):
+    vertices = mesh_data.vertices
+    if not len(vertices):
+        return mesh_data
+    keep, inverse = unique_rows(vertices)
+    if tolerance > 0 and len(keep) > 1:
+        # exact copies are merged first, so each cell holds few vertices
+        distinct, grouped = unique_rows(_spatial_hash_representatives(vertices[keep], tolerance)[:, None])
+        keep, inverse = keep[distinct], grouped[inverse]
+    inverse = inverse.astype(np.int32)
+    return MeshData(vertices[keep], inverse[mesh_data.faces], mesh_data.name, parts=mesh_data.parts)
+
+
+def mesh_from_triangles(triangles, name=None, weld=True):
+    corners = np.ascontiguousarray(triangles).reshape(-1, 3)
+    if not weld:
+        return MeshData(corners, np.arange(len(corners)).reshape(-1, 3), name)
+    keep, inverse = unique_rows(corners)
+    return MeshData(corners[keep], inverse.reshape(-1, 3), name)
+
+
+def select_faces(mesh_data, keep):
+    parts = mesh_data.parts
+    if parts:
+        kept_before = np.concatenate(([0], np.cumsum(keep)))
+        parts = [MeshPart(p.name, int(kept_before[p.face_start]), int(kept_before[p.face_stop]))
+                 for p in parts]
+    return MeshData(mesh_data.vertices, mesh_data.faces[keep], mesh_data.name, parts=parts)
+
+
+def degenerate_faces(mesh_data):
+    f = mesh_data.faces
+    repeated = (f[:, 0] == f[:, 1]) | (f[:, 1] == f[:, 2]) | (f[:, 0] == f[:, 2])
+    a, b, c = (mesh_data.vertices[f[:, i]].astype(np.float64) for i in range(3))
+    zero_area = ~np.cross(b - a, c - a).any(axis=1)
+    return repeated | zero_area
+
+
+def duplicate_faces(mesh_data):
+    # the same three vertices in any order, whatever the winding
+    _, first = np.unique(np.sort(mesh_data.faces, axis=1), axis=0, return_index=True)
+    duplicate = np.ones(mesh_data.n_faces, dtype=bool)
+    duplicate[first] = False
+    return duplicate
+
+
+def merge_meshes(meshes, name=None, weld_tolerance=None, drop_degenerate=False, drop_duplicates=False):
+    merged = concatenate_meshes(meshes, name)
+    if weld_tolerance is not None:
+        merged = weld_vertices(merged, weld_tolerance)
+    if drop_degenerate and merged.n_faces:
+        merged = select_faces(merged, ~degenerate_faces(merged))
+    if drop_duplicates and merged.n_faces:
+        merged = select_faces(merged, ~duplicate_faces(merged))
+    return merged
+
+
+def fan_triangulate(indices, counts):
+    indices = np.asarray(indices)
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(counts) and (counts == 3).all():
+        return indices.reshape(-1, 3)
+
+    starts = np.cumsum(counts) - counts
+    n_tris = np.maximum(counts - 2, 0)
+    poly = np.repeat(np.arange(len(counts)), n_tris)
+    # k-th triangle of a polygon is (v0, v[k+1], v[k+2])
+    k = np.arange(len(poly)) - np.repeat(np.cumsum(n_tris) - n_tris, n_tris)
+    first = starts[poly]
+    return np.stack([indices[first], indices[first + k + 1], indices[first + k + 2]], axis=1)
@@ -0,0 +1,199 @@
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from .meshdata import MeshData, fan_triangulate
+
+OBJ_CHUNK_BYTES = 32 << 20
+OBJ_WRITE_ROWS = 1 << 17
+
+_NEWLINE = ord("\n")
+_SPACE = ord(" ")
+_V_LINE = 1
+_F_LINE = 2
+_FACE_REFS_RE = re.compile(rb"/[^ \t\r\n]*")
+
+
+def iter_line_blocks(fh, chunk_bytes=OBJ_CHUNK_BYTES):
+    tail = b""
+    while True:
+        block = fh.read(chunk_bytes)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind(b"\n") + 1
+        if cut == 0:
+            tail = block
+            continue
+        tail = block[cut:]
+        yield block[:cut]
+    if tail:
+        yield tail + b"\n"
+
+
+def _tokens_per_line(blob, n_lines):
+    buf = np.frombuffer(blob, dtype=np.uint8)
+    newline = buf == _NEWLINE
+    space = (buf == _SPACE) | (buf == 9) | newline | (buf == 13)
+    token_start = ~space
+    token_start[1:] &= space[:-1]
+    line_of_byte = np.cumsum(newline, dtype=np.int32) - newline
+    return np.bincount(line_of_byte[token_start], minlength=n_lines)
+
+
+def _parse_vertices(blob, n_lines):
+    values = np.fromstring(blob, sep=" ")
+    if len(values) == 3 * n_lines:
+        return values.reshape(-1, 3)
+    # w components or vertex colours: keep the position only
+    counts = _tokens_per_line(blob, n_lines)
+    if len(values) != counts.sum() or (counts < 3).any():
+        raise ValueError("Malformed OBJ vertex record")
+    first = np.cumsum(counts) - counts
+    return values[first[:, None] + np.arange(3)]
+
+
+def _parse_faces(blob, n_lines, n_before):
+    if b"/" in blob:
+        blob = _FACE_REFS_RE.sub(b"", blob)
+    indices = np.fromstring(blob, dtype=np.int64, sep=" ")
+    if len(indices) == 3 * n_lines:
+        counts = np.full(n_lines, 3)
+    else:
+        counts = _tokens_per_line(blob, n_lines)
+        if counts.sum() != len(indices):
+            raise ValueError("Malformed OBJ face record")
+    # 1-based indices count from the start of the file; negative ones
+    # count back from the vertices defined before each face line.
+    indices = np.where(indices > 0, indices - 1, np.repeat(n_before, counts) + indices)
+    return fan_triangulate(indices, counts)
+
+
+def _gather_lines(block, line_starts, line_ends, mask, keyword):
+    # OBJ files keep records of one kind in long runs, so copying whole
+    # runs is far cheaper than selecting line by line.
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    blob = b"".join(
+        block[line_starts[a]:line_ends[b - 1]] for a, b in zip(edges[0::2].tolist(), edges[1::2].tolist())
+    )
+    # the keyword letter is the only one of its kind in these records
+    return blob.replace(keyword, b" ")
+
+
+def _parse_block(block, n_vertices):
+    buf = np.frombuffer(block, dtype=np.uint8)
+    line_ends = np.flatnonzero(buf == _NEWLINE) + 1
+    line_starts = np.concatenate(([0], line_ends[:-1]))
+    seconds = buf[np.minimum(line_starts + 1, len(buf) - 1)]
+    keyword_only = (seconds == _SPACE) | (seconds == 9)
+    kind = np.zeros(len(line_starts), dtype=np.int8)
+    kind[keyword_only & (buf[line_starts] == ord("v"))] = _V_LINE
+    kind[keyword_only & (buf[line_starts] == ord("f"))] = _F_LINE
+
+    is_vertex = kind == _V_LINE
+    vertices = _parse_vertices(
+        _gather_lines(block, line_starts, line_ends, is_vertex, b"v"), int(is_vertex.sum())
+    )
+    is_face = kind == _F_LINE
+    if not is_face.any():
+        return vertices, np.empty((0, 3), dtype=np.int64)
+    n_before = n_vertices + (np.cumsum(is_vertex) - is_vertex)[is_face]
+    faces = _parse_faces(
+        _gather_lines(block, line_starts, line_ends, is_face, b"f"), int(is_face.sum()), n_before
+    )
+    return vertices, faces
+
+
+def read_obj(obj_path, vertex_dtype=np.float64, chunk_bytes=OBJ_CHUNK_BYTES):
+    vertex_blocks = []
+    face_blocks = []
+    n_vertices = 0
+    with open(obj_path, "rb") as fh:
+        for block in iter_line_blocks(fh, chunk_bytes):
+            vertices, faces = _parse_block(block, n_vertices)
+            vertex_blocks.append(vertices.astype(vertex_dtype, copy=False))
+            face_blocks.append(faces.astype(np.int32))
+            n_vertices += len(vertices)
+
+    vertices = np.concatenate(vertex_blocks) if vertex_blocks else np.empty((0, 3), dtype=vertex_dtype)
+    faces = np.concatenate(face_blocks) if face_blocks else np.empty((0, 3), dtype=np.int32)
+    if len(faces) and (faces.min() < 0 or faces.max() >= n_vertices):
+        raise ValueError(f"OBJ face index out of range in {obj_path}")
+    return MeshData(vertices, faces, name=os.path.basename(obj_path))
+
+
+def iter_obj_chunks(obj_path, chunk_bytes=OBJ_CHUNK_BYTES, spool_dir=None):
+    # Yields one self-contained MeshData per block of lines. Faces may point
+    # at any earlier vertex, so vertices are spooled to a temporary file and
+    # the ones a block references from before it are read back from there.
+    name = os.path.basename(obj_path)
+    n_vertices = 0
+    with open(obj_path, "rb") as fh, tempfile.TemporaryFile(dir=spool_dir) as spool:
+        for block in iter_line_blocks(fh, chunk_bytes):
+            vertices, faces = _parse_block(block, n_vertices)
+            spool.write(vertices.tobytes())
+            block_start = n_vertices
+            n_vertices += len(vertices)
+            if not len(faces):
+                continue
+            if faces.min() < 0 or faces.max() >= n_vertices:
+                raise ValueError(f"OBJ face index out of range in {obj_path}")
+
+            used, local = np.unique(faces, return_inverse=True)
+            if used[0] >= block_start:
+                coords = vertices[used - block_start]
+            else:
+                spool.flush()
+                stored = np.memmap(spool, dtype=np.float64, mode="r", shape=(n_vertices, 3))
+                coords = np.array(stored[used])
+                del stored
+            yield MeshData(coords, local.reshape(-1, 3), name)
+
+
+def write_rows(fh, fmt, rows, chunk_rows):
+    for start in range(0, len(rows), chunk_rows):
+        block = rows[start:start + chunk_rows]
+        fh.write(((fmt * len(block)) % tuple(block.ravel().tolist())).encode("ascii"))
+
+
+def write_obj_vertices(fh, vertices, precision=9, chunk_rows=OBJ_WRITE_ROWS):
+    write_rows(fh, f"v %.{precision}g %.{precision}g %.{precision}g\n", vertices, chunk_rows)
+
+
+def write_obj_faces(fh, faces, offset=0, chunk_rows=OBJ_WRITE_ROWS):
+    for start in range(0, len(faces), chunk_rows):
+        block = faces[start:start + chunk_rows].astype(np.int64) + (offset + 1)
+        write_rows(fh, "f %d %d %d\n", block, chunk_rows)
+
+
+class ObjStreamWriter:
+    # Face indices in OBJ are global to the file, so every chunk's faces
+    # are offset by the number of vertices written before it.
+    def __init__(self, out_path, precision=9, chunk_rows=OBJ_WRITE_ROWS):
+        self.fh = open(out_path, "wb")
+        self.precision = precision
+        self.chunk_rows = chunk_rows
+        self.n_vertices = 0
+        self.n_faces = 0
+
+    def write(self, mesh_data, name=None):
+        write_obj_vertices(self.fh, mesh_data.vertices, self.precision, self.chunk_rows)
+        write_obj_faces(self.fh, mesh_data.faces, self.n_vertices, self.chunk_rows)
+        self.n_vertices += mesh_data.n_vertices
+        self.n_faces += mesh_data.n_faces
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_obj(mesh_data, out_path, precision=9, chunk_rows=OBJ_WRITE_ROWS):
+    with ObjStreamWriter(out_path, precision, chunk_rows) as writer:
+        writer.write(mesh_data)
@@ -0,0 +1,120 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .instrument import Instrumentation, ListSink, current, stage
+from .instances import duplicate_sources
+from .meshdata import MeshData
+
+LoadResult = namedtuple("LoadResult", ["path", "mesh", "error"])
+
+
+def resolve_workers(workers, n_jobs):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_jobs))
+
+
+def _export_array(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    shm.close()
+    # The receiving process unlinks the block; keep this worker's tracker
+    # from unlinking it again when the pool shuts down.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm.name, array.shape, array.dtype.str
+
+
+def _import_array(descriptor):
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _load_in_worker(fpath, options, job=None):
+    from .converters import load_mesh_file
+
+    # stage records are collected here and replayed into the parent's sinks
+    collector = ListSink()
+    instrumentation = Instrumentation([collector], job) if job is not None else None
+    try:
+        if instrumentation is None:
+            mesh_data = load_mesh_file(fpath, **options)
+        else:
+            with instrumentation.activate():
+                mesh_data = load_mesh_file(fpath, **options)
+    except Exception as ex:
+        return None, f"{type(ex).__name__}: {ex}", collector.records
+    payload = (mesh_data.name, _export_array(mesh_data.vertices), _export_array(mesh_data.faces),
+               mesh_data.parts)
+    return payload, None, collector.records
+
+
+def _receive(future):
+    payload, error, records = future.result()
+    instrumentation = current()
+    if instrumentation is not None:
+        for record in records:
+            instrumentation.emit(record)
+    if payload is None:
+        return None, error
+    name, vertices, faces, parts = payload
+    return MeshData(_import_array(vertices), _import_array(faces), name, parts=parts), None
+
+
+def load_files_parallel(filepaths, workers=None, **options):
+    # Inputs with the same content are loaded once; each repeat gets a
+    # mesh sharing the first one's arrays under its own name.
+    filepaths = list(filepaths)
+    sources = duplicate_sources(filepaths)
+    unique = [fpath for i, fpath in enumerate(filepaths) if sources[i] == i]
+    loaded = dict(zip(unique, _load_unique(unique, workers, **options)))
+
+    results = []
+    for i, fpath in enumerate(filepaths):
+        result = loaded[filepaths[sources[i]]]
+        mesh_data = result.mesh
+        if sources[i] != i and mesh_data is not None:
+            with stage("load", file=os.path.basename(fpath), duplicate_of=os.path.basename(result.path),
+                       triangles=mesh_data.n_faces, vertices=mesh_data.n_vertices):
+                mesh_data = MeshData(mesh_data.vertices, mesh_data.faces, os.path.basename(fpath),
+                                     parts=mesh_data.parts)
+        results.append(LoadResult(fpath, mesh_data, result.error))
+    return results
+
+
+def _load_unique(filepaths, workers=None, **options):
+    if not filepaths:
+        return []
+
+    workers = resolve_workers(workers, len(filepaths))
+    if workers == 1:
+        from .converters import load_mesh_file
+
+        results = []
+        for fpath in filepaths:
+            try:
+                results.append(LoadResult(fpath, load_mesh_file(fpath, **options), None))
+            except Exception as ex:
+                results.append(LoadResult(fpath, None, f"{type(ex).__name__}: {ex}"))
+        return results
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        instrumentation = current()
+        job = None if instrumentation is None else instrumentation.job or ""
+        futures = [pool.submit(_load_in_worker, fpath, options, job) for fpath in filepaths]
+        for fpath, future in zip(filepaths, futures):
+            try:
+                mesh_data, error = _receive(future)
+            except Exception as ex:
+                mesh_data, error = None, f"{type(ex).__name__}: {ex}"
+            results.append(LoadResult(fpath, mesh_data, error))
+    return results
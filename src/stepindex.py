@@ -0,0 +1,417 @@
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+from .cache import DEFAULT_CACHE_DIR
+
+# 2: a ";" inside a quoted string no longer ends a record
+STEP_INDEX_VERSION = 2
+DEFAULT_INDEX_DIR = os.path.join(DEFAULT_CACHE_DIR, "step-index")
+
+# Only the product structure entities are parsed. They are found with a
+# plain substring search, which skips the geometry several times faster
+# than a regex over every record would.
+_KEYWORDS = (b"PRODUCT", b"NEXT_ASSEMBLY_USAGE_OCCURRENCE")
+_ENTITY_RE = re.compile(
+    rb"\s*#(\d+)\s*=\s*(PRODUCT_DEFINITION_FORMATION\w*|PRODUCT_DEFINITION|PRODUCT"
+    rb"|NEXT_ASSEMBLY_USAGE_OCCURRENCE)\s*\("
+)
+_HEAD_RE = re.compile(rb"\s*#(\d+)\s*=")
+_RECORD_START_RE = re.compile(rb";\s*#(\d+)\s*=")
+_TYPE_RE = re.compile(rb"\s*(\w+)\s*\(")
+_LENGTH_UNIT_RE = re.compile(rb"(?<!\w)LENGTH_UNIT\s*\(")
+_SI_LENGTH_RE = re.compile(rb"SI_UNIT\s*\(\s*(\.\w+\.|\$)\s*,\s*\.METRE\.")
+_CONVERSION_RE = re.compile(rb"CONVERSION_BASED_UNIT\s*\(\s*'((?:[^']|'')*)'")
+_SI_PREFIX_MM = {b"$": 1000.0, b".KILO.": 1e6, b".DECI.": 100.0, b".CENTI.": 10.0, b".MILLI.": 1.0,
+                 b".MICRO.": 1e-3, b".NANO.": 1e-6}
+_NAMED_LENGTH_MM = {"INCH": 25.4, "FOOT": 304.8, "YARD": 914.4, "MILE": 1609344.0, "MIL": 0.0254}
+_ARG_RE = re.compile(rb"'((?:[^']|'')*)'|#(\d+)|([()])|([^,()']+)")
+_ESCAPE_RE = re.compile(r"\\X2\\((?:[0-9A-F]{4})+)\\X0\\|\\X\\([0-9A-F]{2})")
+
+
+def _decode(raw):
+    # ISO 10303-21 string escapes for non-ASCII names
+    text = raw.replace(b"''", b"'").decode("latin-1")
+    if "\\" not in text:
+        return text
+
+    def replace(match):
+        if match.group(1):
+            return bytes.fromhex(match.group(1)).decode("utf-16-be")
+        return bytes.fromhex(match.group(2)).decode("latin-1")
+    return _ESCAPE_RE.sub(replace, text)
+
+
+def _top_level_args(record):
+    # strings and references at the top level of an entity's parameter list
+    args = []
+    depth = 0
+    for match in _ARG_RE.finditer(record):
+        string, ref, paren, other = match.groups()
+        if paren is not None:
+            depth += 1 if paren == b"(" else -1
+            if depth == 1 and paren == b"(":
+                args.append(None)
+        elif depth == 0:
+            if string is not None:
+                args.append(_decode(string))
+            elif ref is not None:
+                args.append(int(ref))
+            elif other.strip():
+                args.append(other.strip().decode("ascii", "replace"))
+    return args
+
+
+def _record_end(data, pos):
+    # the ';' closing the record, skipping quoted strings ('' is an escaped
+    # quote, which reads as one string ending where the next begins)
+    while True:
+        end = data.find(b";", pos)
+        quote = data.find(b"'", pos, end) if end != -1 else -1
+        if quote == -1:
+            return end
+        pos = data.find(b"'", quote + 1)
+        if pos == -1:
+            return -1
+        pos += 1
+
+
+def _iter_records(data):
+    # (entity id, entity type, parameter bytes) of the structure entities.
+    # The previous record's strings all come before its closing ';', so the
+    # last ';' ahead of an entity keyword is where the entity starts.
+    for keyword in _KEYWORDS:
+        found = data.find(keyword)
+        while found != -1:
+            match = _ENTITY_RE.match(data, data.rfind(b";", 0, found) + 1)
+            end = None
+            if match is not None and match.start(2) == found:
+                end = _record_end(data, match.end())
+                if end == -1:
+                    break
+                record = data[match.end():end].rstrip()
+                if record.endswith(b")"):
+                    yield int(match.group(1)), match.group(2), record[:-1]
+                end += 1
+            found = data.find(keyword, end if end else found + 1)
+
+
+def _iter_entities(data, keyword):
+    # (entity id, record bytes after the '=') of the simple or complex
+    # entities whose type list names keyword
+    found = data.find(keyword)
+    while found != -1:
+        end = None
+        before = data[max(found - 64, 0):found].rstrip()[-1:]
+        after = data[found + len(keyword):found + len(keyword) + 64].lstrip()[:1]
+        if before in (b"=", b"(", b")") and after == b"(":
+            match = _HEAD_RE.match(data, data.rfind(b";", 0, found) + 1)
+            if match is not None:
+                end = _record_end(data, match.end())
+                if end == -1:
+                    return
+                yield int(match.group(1)), data[match.end():end]
+                end += 1
+        found = data.find(keyword, end if end else found + 1)
+
+
+def _refs(record):
+    return [int(match.group(2)) for match in _ARG_RE.finditer(record) if match.group(2)]
+
+
+def _args(record):
+    # the parameter list as nested lists of strings, references (int) and
+    # other tokens
+    stack = [[]]
+    for match in _ARG_RE.finditer(record):
+        string, ref, paren, other = match.groups()
+        if paren == b"(":
+            stack.append([])
+        elif paren == b")":
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif string is not None:
+            stack[-1].append(_decode(string))
+        elif ref is not None:
+            stack[-1].append(int(ref))
+        elif other.strip():
+            stack[-1].append(other.strip().decode("ascii", "replace"))
+    return stack[0]
+
+
+def _find_record(data, entity_id):
+    # record bytes after the '=' of one entity. Writers number entities in
+    # file order, so a binary search over record starts narrows it down in
+    # a few probes; a file that is not in order falls back to a search of
+    # the whole file.
+    pattern = re.compile(rb";\s*#%d\s*=" % entity_id)
+    lo, hi = 0, len(data)
+    while hi - lo > 65536:
+        mid = (lo + hi) // 2
+        probe = _RECORD_START_RE.search(data, mid, hi)
+        if probe is None:
+            break
+        if int(probe.group(1)) < entity_id:
+            lo = probe.start()
+        elif int(probe.group(1)) > entity_id:
+            hi = probe.start()
+        else:
+            break
+    match = pattern.search(data, lo, hi) or pattern.search(data)
+    if match is None:
+        return None
+    end = _record_end(data, match.end())
+    return data[match.end():end] if end != -1 else None
+
+
+def _find_entity(data, entity_id):
+    # (entity type, parameter list) of one simple entity
+    record = _find_record(data, entity_id)
+    match = _TYPE_RE.match(record) if record is not None else None
+    if match is None:
+        return None, []
+    record = record.rstrip()
+    return match.group(1), _args(record[match.end():-1] if record.endswith(b")") else record[match.end():])
+
+
+def _vector(data, entity_id, default):
+    kind, args = _find_entity(data, entity_id) if isinstance(entity_id, int) else (None, [])
+    if kind in (b"CARTESIAN_POINT", b"DIRECTION") and len(args) >= 2 and isinstance(args[1], list):
+        return np.array([float(v) for v in args[1]], dtype=np.float64)
+    return np.array(default, dtype=np.float64)
+
+
+def _axis_matrix(data, axis_id, scale):
+    # 4x4 matrix of an AXIS2_PLACEMENT_3D: its location and its x, y and z
+    # directions, with the location converted to millimetres
+    kind, args = _find_entity(data, axis_id)
+    matrix = np.eye(4)
+    if kind != b"AXIS2_PLACEMENT_3D" or len(args) < 2:
+        return matrix
+    location = _vector(data, args[1], (0.0, 0.0, 0.0))
+    z = _vector(data, args[2] if len(args) > 2 else None, (0.0, 0.0, 1.0))
+    x = _vector(data, args[3] if len(args) > 3 else None, (1.0, 0.0, 0.0))
+    z /= np.linalg.norm(z)
+    x -= np.dot(x, z) * z
+    x /= np.linalg.norm(x)
+    matrix[:3, 0] = x
+    matrix[:3, 1] = np.cross(z, x)
+    matrix[:3, 2] = z
+    matrix[:3, 3] = location * scale
+    return matrix
+
+
+def _length_unit_mm(data):
+    # millimetres per length unit of the first representation context,
+    # since OCC converts shapes to millimetres
+    for _, record in _iter_entities(data, b"GLOBAL_UNIT_ASSIGNED_CONTEXT"):
+        for unit_id in _refs(record):
+            unit = _find_record(data, unit_id)
+            if unit is None or _LENGTH_UNIT_RE.search(unit) is None:
+                continue
+            si = _SI_LENGTH_RE.search(unit)
+            if si is not None:
+                return _SI_PREFIX_MM.get(si.group(1), 1.0)
+            named = _CONVERSION_RE.search(unit)
+            if named is not None:
+                return _NAMED_LENGTH_MM.get(_decode(named.group(1)).upper(), 1.0)
+        break
+    return 1.0
+
+
+def occurrence_placements(step_path, occurrences):
+    # {occurrence id: 4x4 matrix placing the child in its parent, in mm}
+    # for the given occurrences of the index. An occurrence points
+    # at its placement through a PRODUCT_DEFINITION_SHAPE, a
+    # CONTEXT_DEPENDENT_SHAPE_REPRESENTATION, a representation relationship
+    # with transformation and an ITEM_DEFINED_TRANSFORMATION whose first
+    # axis is mapped onto its second. The relationship's first
+    # representation should be the child's; when it is the parent's, the
+    # transformation is inverted.
+    if not occurrences:
+        return {}
+    with open(step_path, "rb") as fh:
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        shape_of = {}
+        for entity_id, record in _iter_entities(data, b"PRODUCT_DEFINITION_SHAPE"):
+            refs = _refs(record)
+            if refs:
+                shape_of[refs[-1]] = entity_id
+        representation_of = {}
+        for _, record in _iter_entities(data, b"SHAPE_DEFINITION_REPRESENTATION"):
+            refs = _refs(record)
+            if len(refs) >= 2:
+                representation_of[refs[0]] = refs[1]
+        relationship_of = {}
+        for _, record in _iter_entities(data, b"CONTEXT_DEPENDENT_SHAPE_REPRESENTATION"):
+            refs = _refs(record)
+            if len(refs) >= 2:
+                relationship_of[refs[1]] = refs[0]
+        relationships = {}
+        for keyword in (b"REPRESENTATION_RELATIONSHIP_WITH_TRANSFORMATION",
+                        b"REPRESENTATION_RELATIONSHIP_WITH_TRANSFORMATION_AND_SHAPE_REPRESENTATION_RELATIONSHIP"):
+            for entity_id, record in _iter_entities(data, keyword):
+                refs = _refs(record)
+                if len(refs) >= 3:
+                    relationships[entity_id] = refs[:3]
+
+        scale = _length_unit_mm(data)
+        placements = {}
+        for occurrence in occurrences:
+            parent, child = occurrence["parent"], occurrence["child"]
+            relationship = relationships.get(relationship_of.get(shape_of.get(occurrence["id"])))
+            if relationship is None:
+                continue
+            first, second, transformation = relationship
+            kind, args = _find_entity(data, transformation)
+            refs = [a for a in args if isinstance(a, int)]
+            if kind != b"ITEM_DEFINED_TRANSFORMATION" or len(refs) < 2:
+                continue
+            source = _axis_matrix(data, refs[0], scale)
+            target = _axis_matrix(data, refs[1], scale)
+            reversed_ = (representation_of.get(shape_of.get(child)) == second
+                         or representation_of.get(shape_of.get(parent)) == first)
+            if reversed_:
+                source, target = target, source
+            placements[occurrence["id"]] = target @ np.linalg.inv(source)
+    finally:
+        data.close()
+    return placements
+
+
+def scan_step_structure(step_path):
+    products = {}
+    formations = {}
+    definitions = {}
+    occurrences = []
+    with open(step_path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return {"products": [], "occurrences": []}
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        for entity_id, kind, record in _iter_records(data):
+            args = _top_level_args(record)
+            if kind == b"PRODUCT" and len(args) >= 2:
+                products[entity_id] = (args[0], args[1])
+            elif kind.startswith(b"PRODUCT_DEFINITION_FORMATION") and len(args) >= 3:
+                formations[entity_id] = args[2]
+            elif kind == b"PRODUCT_DEFINITION" and len(args) >= 3:
+                definitions[entity_id] = args[2]
+            elif kind == b"NEXT_ASSEMBLY_USAGE_OCCURRENCE" and len(args) >= 5:
+                occurrences.append({"id": entity_id, "name": args[1] or args[0],
+                                    "parent": args[3], "child": args[4]})
+    finally:
+        data.close()
+
+    # a product definition points at a formation, which points at the product
+    entries = []
+    for definition_id, formation_id in definitions.items():
+        product_id, name = products.get(formations.get(formation_id), ("", ""))
+        entries.append({"id": definition_id, "product_id": product_id, "name": name or product_id})
+    return {"products": entries, "occurrences": occurrences}
+
+
+def _index_path(step_path, index_dir):
+    key = hashlib.sha256(os.path.abspath(step_path).encode("utf-8")).hexdigest()
+    return os.path.join(index_dir, key[:2], key + ".json")
+
+
+def step_index(step_path, index_dir=DEFAULT_INDEX_DIR):
+    # The index is stored per input path and reused while the file's size
+    # and modification time are unchanged; index_dir=None disables storing.
+    stat = os.stat(step_path)
+    stamp = {"version": STEP_INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    index_path = _index_path(step_path, index_dir) if index_dir else None
+    if index_path is not None:
+        try:
+            with open(index_path) as fh:
+                index = json.load(fh)
+            if all(index.get(k) == v for k, v in stamp.items()):
+                return index
+        except (OSError, ValueError):
+            pass
+
+    index = {**stamp, "path": os.path.abspath(step_path), **scan_step_structure(step_path)}
+    if index_path is not None:
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with open(index_path + ".tmp", "w") as fh:
+                json.dump(index, fh)
+            os.replace(index_path + ".tmp", index_path)
+        except OSError:
+            pass
+    return index
+
+
+def product_tree(index):
+    # [(depth, occurrence name or None, product entry, occurrence ids from
+    # the root)] in depth-first order
+    products = {p["id"]: p for p in index["products"]}
+    children = {}
+    for occurrence in index["occurrences"]:
+        children.setdefault(occurrence["parent"], []).append(occurrence)
+    used = {o["child"] for o in index["occurrences"]}
+
+    rows = []
+
+    def walk(definition_id, occurrence_name, path, seen):
+        product = products.get(definition_id)
+        if product is None or definition_id in seen:
+            return
+        rows.append((len(path), occurrence_name, product, path))
+        for occurrence in children.get(definition_id, []):
+            walk(occurrence["child"], occurrence["name"], path + (occurrence["id"],), seen | {definition_id})
+
+    for product in index["products"]:
+        if product["id"] not in used:
+            walk(product["id"], None, (), frozenset())
+    return rows
+
+
+def select_products(index, patterns):
+    # Patterns are matched case-insensitively against a product's name, its
+    # product id, an occurrence name, or the slash-joined path of names from
+    # the root ("Plant/Line 1/Pump*"). A match inside an already selected
+    # subassembly is dropped; its geometry comes with the subassembly. A
+    # product used more than once is selected once per matching occurrence,
+    # each entry listing the occurrence ids that place it from the root.
+    patterns = [p.lower() for p in patterns]
+    selected = []
+    path = []
+    covered_depth = None
+    for depth, occurrence_name, product, occurrences in product_tree(index):
+        del path[depth:]
+        path.append(product["name"])
+        if covered_depth is not None and depth > covered_depth:
+            continue
+        covered_depth = None
+        names = [product["name"], product["product_id"], occurrence_name or "", "/".join(path)]
+        if any(fnmatch.fnmatchcase(n.lower(), p) for n in names for p in patterns):
+            covered_depth = depth
+            selected.append({**product, "occurrence": occurrence_name, "occurrences": list(occurrences)})
+    return selected
+
+
+def product_placement(placements, occurrences):
+    # 4x4 matrix placing a selected product in the root's coordinates
+    matrix = np.eye(4)
+    for occurrence_id in occurrences:
+        matrix = matrix @ placements.get(occurrence_id, np.eye(4))
+    return matrix
+
+
+def format_product_tree(index):
+    lines = []
+    for depth, occurrence_name, product, _ in product_tree(index):
+        label = product["name"]
+        if occurrence_name and occurrence_name != label:
+            label = f"{label} ({occurrence_name})"
+        lines.append(f"{'  ' * depth}{label}  #{product['id']}")
+    return "\n".join(lines)
@@ -0,0 +1,297 @@
+import os
+from itertools import chain
+
+import numpy as np
+
+from OCC.Core.XCAFApp import XCAFApp_Application
+from OCC.Core.XCAFDoc import XCAFDoc_DocumentTool, XCAFDoc_ShapeTool
+from OCC.Core.TDF import TDF_LabelSequence
+from OCC.Core.TCollection import TCollection_ExtendedString
+from OCC.Core.STEPCAFControl import STEPCAFControl_Reader, STEPCAFControl_Writer
+from OCC.Core.IFSelect import IFSelect_RetDone
+from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Face, TopoDS_Shell, topods
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.gp import gp_Pnt, gp_Trsf, gp_Vec
+from OCC.Core.BRepBuilderAPI import (
+    BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakePolygon, BRepBuilderAPI_MakeShapeOnMesh,
+)
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.Poly import Poly_Triangle, Poly_Triangulation
+from OCC.Core.Interface import Interface_Static
+from OCC.Core.STEPControl import STEPControl_Reader
+from .instrument import stage
+from .meshdata import MeshData, concatenate_meshes, weld_vertices
+from .stepindex import occurrence_placements, product_placement, select_products, step_index
+
+# Everything that needs pythonocc lives here, so that importing the
+# converters for mesh-only jobs never loads OCC.
+
+
+def create_empty_xcaf_doc():
+    app = XCAFApp_Application.GetApplication()
+    fmt = TCollection_ExtendedString("BinXCAF")
+    doc_handle = app.NewDocument(fmt)
+    doc = doc_handle.get()
+    shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())
+    return doc, shape_tool
+
+
+def transfer_step_products(filepath, select):
+    # Transfers only the product definitions matching the select patterns,
+    # found through the text index, instead of every root of the file.
+    # Each is placed where its occurrences put it in the root assembly; a
+    # product selected at several occurrences is transferred once.
+    index = step_index(filepath)
+    products = select_products(index, select)
+    if not products:
+        raise ValueError(f"No products matching {', '.join(select)} in {filepath}")
+    used = {o for p in products for o in p["occurrences"]}
+    placements = occurrence_placements(filepath, [o for o in index["occurrences"] if o["id"] in used])
+    reader = STEPControl_Reader()
+    if reader.ReadFile(filepath) != IFSelect_RetDone:
+        raise IOError(f"Failed to read STEP: {filepath}")
+    model = reader.StepModel()
+    transferred = {}
+    shapes = []
+    for product in products:
+        if product["id"] not in transferred:
+            number = model.NextNumberForLabel(f"#{product['id']}", 0, True)
+            if number <= 0:
+                raise ValueError(f"Product #{product['id']} not found in {filepath}")
+            if not reader.TransferEntity(model.Value(number)):
+                print(f"Failed to transfer {product['name']} (#{product['id']}) from {filepath}")
+                transferred[product["id"]] = None
+                continue
+            transferred[product["id"]] = reader.Shape(reader.NbShapes())
+        shape = transferred[product["id"]]
+        if shape is None:
+            continue
+        matrix = product_placement(placements, product["occurrences"])
+        if not np.allclose(matrix, np.eye(4)):
+            trsf = gp_Trsf()
+            trsf.SetValues(*matrix[:3].ravel().tolist())
+            shape = shape.Moved(TopLoc_Location(trsf))
+        shapes.append((product["name"], shape))
+    return shapes
+
+
+def load_step_xcaf(filepath, select=None):
+    doc, shape_tool = create_empty_xcaf_doc()
+    if select:
+        for name, shape in transfer_step_products(filepath, select):
+            add_occ_shape_to_xcaf(doc, shape_tool, shape, label_name=name)
+        return doc, shape_tool
+    reader = STEPCAFControl_Reader()
+    status = reader.ReadFile(filepath)
+    if status == IFSelect_RetDone:
+        reader.Transfer(doc.GetHandle())
+    else:
+        raise IOError(f"Failed to read STEP: {filepath}")
+    return doc, shape_tool
+
+
+def merge_xcaf_docs_into(target_doc, target_shape_tool, source_doc):
+    source_shape_tool = XCAFDoc_DocumentTool.ShapeTool(source_doc.Main())
+    it = source_shape_tool.NewIterator()
+    while it.More():
+        source_label = it.Value()
+        source_shape_tool.CopyShape(source_label, target_shape_tool)
+        it.Next()
+
+
+def xcaf_doc_shape(doc):
+    # the free shapes of a document, as one compound when there are several
+    shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())
+    labels = TDF_LabelSequence()
+    shape_tool.GetFreeShapes(labels)
+    shapes = [XCAFDoc_ShapeTool.GetShape(labels.Value(i)) for i in range(1, labels.Length() + 1)]
+    if len(shapes) == 1:
+        return shapes[0]
+    compound = TopoDS_Compound()
+    builder = BRep_Builder()
+    builder.MakeCompound(compound)
+    for shape in shapes:
+        builder.Add(compound, shape)
+    return compound
+
+
+def save_xcaf_to_step(doc, out_path, tessellated=False):
+    # Tessellated faces are only written by AP242, and the schema has to be
+    # chosen before the writer creates its model. Both settings are process
+    # global, so they are restored for later writes.
+    schema = Interface_Static.CVal("write.step.schema")
+    tessellation = Interface_Static.IVal("write.step.tessellated")
+    if tessellated:
+        Interface_Static.SetCVal("write.step.schema", "AP242DIS")
+        Interface_Static.SetIVal("write.step.tessellated", 1)
+    try:
+        writer = STEPCAFControl_Writer()
+        writer.Transfer(doc.GetHandle())
+        writer.Write(out_path)
+    finally:
+        Interface_Static.SetCVal("write.step.schema", schema)
+        Interface_Static.SetIVal("write.step.tessellated", tessellation)
+
+
+STEP_MESH_MODES = ("shell", "tessellated", "faces")
+
+
+def mesh_to_triangulation(mesh_data):
+    vertices = mesh_data.vertices.astype(np.float64).tolist()
+    faces = (mesh_data.faces.astype(np.int64) + 1).tolist()
+    triangulation = Poly_Triangulation(len(vertices), len(faces), False)
+    for i, (x, y, z) in enumerate(vertices, 1):
+        triangulation.SetNode(i, gp_Pnt(x, y, z))
+    for i, (i1, i2, i3) in enumerate(faces, 1):
+        triangulation.SetTriangle(i, Poly_Triangle(i1, i2, i3))
+    return triangulation
+
+
+def mesh_to_occ_shell(mesh_data):
+    # One planar face per triangle, built in C++ with a single vertex per
+    # node and a single edge per node pair, so neighbouring faces are
+    # already connected and need no sewing.
+    maker = BRepBuilderAPI_MakeShapeOnMesh(mesh_to_triangulation(mesh_data))
+    maker.Build()
+    builder = BRep_Builder()
+    shell = TopoDS_Shell()
+    builder.MakeShell(shell)
+    exp = TopExp_Explorer(maker.Shape(), TopAbs_FACE)
+    while exp.More():
+        builder.Add(shell, exp.Current())
+        exp.Next()
+    return shell
+
+
+def mesh_to_occ_tessellated(mesh_data):
+    # A face carrying only a triangulation, written to STEP as one
+    # tessellated (triangulated_face) entity instead of B-Rep geometry.
+    face = TopoDS_Face()
+    BRep_Builder().MakeFace(face, mesh_to_triangulation(mesh_data))
+    return face
+
+
+def mesh_to_occ_shape(mesh_data, mode="shell"):
+    if mode == "shell":
+        return mesh_to_occ_shell(mesh_data)
+    if mode == "tessellated":
+        return mesh_to_occ_tessellated(mesh_data)
+    if mode != "faces":
+        raise ValueError(f"Unsupported STEP mesh mode: {mode}")
+
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+
+    points = [gp_Pnt(x, y, z) for x, y, z in mesh_data.vertices.astype(np.float64).tolist()]
+    for i1, i2, i3 in mesh_data.faces.tolist():
+        polygon_maker = BRepBuilderAPI_MakePolygon(points[i1], points[i2], points[i3], True)
+        wire = polygon_maker.Wire()
+        face_maker = BRepBuilderAPI_MakeFace(wire)
+        if face_maker.IsDone():
+            face = face_maker.Face()
+            builder.Add(compound, face)
+
+    return compound
+
+
+def add_occ_shape_to_xcaf(doc, shape_tool, shape, label_name="TessellatedMesh"):
+    label = shape_tool.AddShape(shape)
+    shape_tool.SetShapeName(label, TCollection_ExtendedString(label_name))
+    return label
+
+
+def add_occ_instances_to_xcaf(doc, shape_tool, shape, placements, label_name="TessellatedMesh",
+                              make_assembly=False):
+    # The shape is stored once and each (name, translation) placement
+    # becomes a located component of an assembly, which the STEP writer
+    # turns into one product with several occurrences. make_assembly keeps
+    # the sub-assemblies of a shape read from STEP as labels of their own.
+    prototype = shape_tool.AddShape(shape, make_assembly)
+    shape_tool.SetShapeName(prototype, TCollection_ExtendedString(label_name))
+    assembly = shape_tool.NewShape()
+    shape_tool.SetShapeName(assembly, TCollection_ExtendedString(f"{label_name} x{len(placements)}"))
+    for name, translation in placements:
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(*(float(v) for v in translation)))
+        component = shape_tool.AddComponent(assembly, prototype, TopLoc_Location(trsf))
+        shape_tool.SetShapeName(component, TCollection_ExtendedString(name))
+    shape_tool.UpdateAssemblies()
+    return assembly
+
+
+def triangulation_to_mesh(face):
+    location = TopLoc_Location()
+    triangulation = BRep_Tool.Triangulation(face, location)
+    if triangulation is None:
+        return None
+
+    n_nodes = triangulation.NbNodes()
+    n_tris = triangulation.NbTriangles()
+    # pythonocc exposes no buffer over the node and triangle arrays, so they
+    # are copied with one call per node (Coord) and one per triangle (Get)
+    vertices = np.fromiter(
+        chain.from_iterable(triangulation.Node(i).Coord() for i in range(1, n_nodes + 1)),
+        dtype=np.float64, count=3 * n_nodes,
+    ).reshape(-1, 3)
+    faces = np.fromiter(
+        chain.from_iterable(triangulation.Triangle(i).Get() for i in range(1, n_tris + 1)),
+        dtype=np.int32, count=3 * n_tris,
+    ).reshape(-1, 3)
+    faces -= 1
+
+    if not location.IsIdentity():
+        trsf = location.Transformation()
+        matrix = np.array([[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)])
+        vertices = vertices @ matrix[:, :3].T + matrix[:, 3]
+    if face.Orientation() == TopAbs_REVERSED:
+        faces = faces[:, [0, 2, 1]]
+    return MeshData(vertices, faces)
+
+
+def tessellate_step_shape(shape, deflection=0.1, weld_tolerance=0.0,
+                          angular_deflection=0.5, relative=True, parallel=True):
+    with stage("tessellate", parallel=parallel):
+        BRepMesh_IncrementalMesh(shape, deflection, relative, angular_deflection, parallel)
+
+    with stage("triangulation_extract") as record:
+        face_meshes = []
+        exp = TopExp_Explorer(shape, TopAbs_FACE)
+        while exp.More():
+            face_mesh = triangulation_to_mesh(topods.Face(exp.Current()))
+            if face_mesh is not None:
+                face_meshes.append(face_mesh)
+            exp.Next()
+
+        merged = concatenate_meshes(face_meshes, track_parts=False)
+        if weld_tolerance is not None:
+            merged = weld_vertices(merged, weld_tolerance)
+        record.update(faces=len(face_meshes), triangles=merged.n_faces, vertices=merged.n_vertices)
+    return merged
+
+
+def load_step_as_mesh(step_path, linear_deflection=0.1, angular_deflection=0.5, parallel=True, select=None):
+    with stage("step_read", file=os.path.basename(step_path), bytes_read=os.path.getsize(step_path)):
+        if select:
+            shape = TopoDS_Compound()
+            builder = BRep_Builder()
+            builder.MakeCompound(shape)
+            for _, product_shape in transfer_step_products(step_path, select):
+                builder.Add(shape, product_shape)
+        else:
+            reader = STEPControl_Reader()
+            if reader.ReadFile(step_path) != IFSelect_RetDone:
+                raise IOError(f"Failed to read STEP: {step_path}")
+            if reader.TransferRoots() == 0:
+                raise IOError(f"No shapes transferred from STEP: {step_path}")
+            shape = reader.OneShape()
+    mesh_data = tessellate_step_shape(
+        shape, linear_deflection,
+        angular_deflection=angular_deflection, parallel=parallel,
+    )
+    mesh_data.name = os.path.basename(step_path)
+    return mesh_data
@@ -0,0 +1,132 @@
+import os
+import re
+
+import numpy as np
+
+from .meshdata import mesh_from_triangles
+from .objio import OBJ_CHUNK_BYTES, iter_line_blocks
+
+STL_HEADER = b"binary STL written by CADConverter".ljust(80, b" ")
+STL_RECORD_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vectors", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+STL_WRITE_FACES = 1 << 18
+
+# "vertex" only as the keyword of its line, not inside a solid name
+_VERTEX_RE = re.compile(rb"^[ \t]*vertex([ \t][^\r\n]*)", re.M)
+
+
+def is_binary_stl(stl_path):
+    size = os.path.getsize(stl_path)
+    if size < 84:
+        return False
+    with open(stl_path, "rb") as fh:
+        header = fh.read(84)
+    n_faces = int(np.frombuffer(header, dtype="<u4", count=1, offset=80)[0])
+    # "solid" headers are common in binary files too, so trust the size
+    return size == 84 + n_faces * STL_RECORD_DTYPE.itemsize
+
+
+def _read_binary_triangles(stl_path):
+    n_faces = (os.path.getsize(stl_path) - 84) // STL_RECORD_DTYPE.itemsize
+    if n_faces == 0:
+        return np.empty((0, 3, 3), dtype=np.float32)
+    # The records are viewed in place through the page cache; only the
+    # vertex columns are ever copied out.
+    records = np.memmap(stl_path, dtype=STL_RECORD_DTYPE, mode="r", offset=84, shape=(n_faces,))
+    return records["vectors"]
+
+
+def _iter_ascii_triangles(stl_path, chunk_bytes=OBJ_CHUNK_BYTES):
+    carry = np.empty(0, dtype=np.float32)
+    with open(stl_path, "rb") as fh:
+        for block in iter_line_blocks(fh, chunk_bytes):
+            coords = _VERTEX_RE.findall(block)
+            values = np.fromstring(b" ".join(coords), dtype=np.float32, sep=" ")
+            if len(values) != 3 * len(coords):
+                raise ValueError(f"Malformed STL vertex record in {stl_path}")
+            # a facet may straddle two blocks
+            values = np.concatenate([carry, values])
+            cut = len(values) - len(values) % 9
+            carry = values[cut:]
+            yield values[:cut].reshape(-1, 3, 3)
+    if len(carry):
+        raise ValueError(f"STL facet without three vertices in {stl_path}")
+
+
+def _iter_triangle_blocks(stl_path, chunk_bytes):
+    if not is_binary_stl(stl_path):
+        yield from _iter_ascii_triangles(stl_path, chunk_bytes)
+        return
+    triangles = _read_binary_triangles(stl_path)
+    step = max(chunk_bytes // STL_RECORD_DTYPE.itemsize, 1)
+    for start in range(0, len(triangles), step):
+        yield triangles[start:start + step]
+
+
+def iter_stl_chunks(stl_path, chunk_bytes=OBJ_CHUNK_BYTES, weld=True):
+    name = os.path.basename(stl_path)
+    for triangles in _iter_triangle_blocks(stl_path, chunk_bytes):
+        yield mesh_from_triangles(triangles, name, weld)
+
+
+def read_stl(stl_path, weld=True):
+    if is_binary_stl(stl_path):
+        triangles = _read_binary_triangles(stl_path)
+    else:
+        blocks = list(_iter_ascii_triangles(stl_path))
+        triangles = np.concatenate(blocks) if blocks else np.empty((0, 3, 3), dtype=np.float32)
+    return mesh_from_triangles(triangles, os.path.basename(stl_path), weld)
+
+
+def facet_normals(triangles):
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return normals
+
+
+def stl_records(vertices, faces):
+    triangles = vertices[faces]
+    records = np.zeros(len(faces), dtype=STL_RECORD_DTYPE)
+    records["vectors"] = triangles
+    records["normal"] = facet_normals(triangles)
+    return records
+
+
+class StlStreamWriter:
+    # The facet count in the header is patched in on close.
+    def __init__(self, out_path, chunk_faces=STL_WRITE_FACES):
+        self.fh = open(out_path, "wb")
+        self.chunk_faces = chunk_faces
+        self.n_faces = 0
+        self.fh.write(STL_HEADER)
+        self.fh.write(np.uint32(0).tobytes())
+
+    def write(self, mesh_data, name=None):
+        for start in range(0, mesh_data.n_faces, self.chunk_faces):
+            faces = mesh_data.faces[start:start + self.chunk_faces]
+            stl_records(mesh_data.vertices, faces).tofile(self.fh)
+            self.n_faces += len(faces)
+
+    def close(self):
+        if self.n_faces >= 1 << 32:
+            self.fh.close()
+            raise ValueError("Binary STL cannot hold more than 2**32 - 1 facets")
+        self.fh.seek(80)
+        self.fh.write(np.uint32(self.n_faces).tobytes())
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_stl(mesh_data, out_path, chunk_size=None):
+    with StlStreamWriter(out_path, chunk_size or STL_WRITE_FACES) as writer:
+        writer.write(mesh_data)
@@ -0,0 +1,83 @@
+import os
+
+from .cmbio import CmbStreamWriter, iter_cmb_chunks
+from .dxfio import DXF_CHUNK_BYTES, DxfStreamWriter, iter_dxf_chunks
+from .glbio import GlbStreamWriter, iter_glb_chunks
+from .instrument import stage
+from .meshdata import degenerate_faces, select_faces
+from .objio import OBJ_CHUNK_BYTES, ObjStreamWriter, iter_obj_chunks
+from .stlio import StlStreamWriter, iter_stl_chunks
+
+# Every chunk is a self-contained MeshData whose faces index its own
+# vertices; writers keep whatever running offsets their format needs.
+
+
+def _iter_step_chunks(step_path, chunk_bytes=None, linear_deflection=0.1, angular_deflection=0.5,
+                      step_select=None):
+    from .converters import load_step_as_mesh
+
+    # OCC holds the whole shape in memory anyway
+    yield load_step_as_mesh(step_path, linear_deflection, angular_deflection, select=step_select)
+
+
+def iter_mesh_chunks(fpath, chunk_bytes=OBJ_CHUNK_BYTES, linear_deflection=0.1, angular_deflection=0.5,
+                     step_select=None):
+    ext = os.path.splitext(fpath)[1].lower()
+    if ext == ".stl":
+        return iter_stl_chunks(fpath, chunk_bytes)
+    if ext == ".obj":
+        return iter_obj_chunks(fpath, chunk_bytes)
+    if ext == ".dxf":
+        return iter_dxf_chunks(fpath, min(chunk_bytes, DXF_CHUNK_BYTES))
+    if ext == ".cmb":
+        return iter_cmb_chunks(fpath, chunk_bytes)
+    if ext == ".glb":
+        return iter_glb_chunks(fpath, chunk_bytes)
+    if ext == ".step":
+        return _iter_step_chunks(fpath, chunk_bytes, linear_deflection, angular_deflection, step_select)
+    raise ValueError(f"Unsupported format: {fpath}")
+
+
+def open_stream_writer(out_path, out_format, dxf_mode="polyface", glb_quantize=None, glb_narrow_indices=True):
+    if out_format == "stl":
+        return StlStreamWriter(out_path)
+    if out_format == "obj":
+        return ObjStreamWriter(out_path)
+    if out_format == "dxf":
+        return DxfStreamWriter(out_path, dxf_mode)
+    if out_format == "cmb":
+        return CmbStreamWriter(out_path)
+    if out_format == "glb":
+        return GlbStreamWriter(out_path, glb_quantize, glb_narrow_indices)
+    raise ValueError(f"Output format cannot be streamed: {out_format}")
+
+
+def stream_files_to_mesh(filepaths, out_path, out_format, chunk_bytes=OBJ_CHUNK_BYTES,
+                         linear_deflection=0.1, angular_deflection=0.5, dxf_mode="polyface",
+                         drop_degenerate=False, step_select=None, glb_quantize=None, glb_narrow_indices=True):
+    # Inputs are read and written one chunk at a time, so memory is bounded
+    # by the chunk size rather than by the total input size. A file that
+    # fails part way through keeps the chunks already written.
+    failures = []
+    with open_stream_writer(out_path, out_format, dxf_mode, glb_quantize, glb_narrow_indices) as writer:
+        for fpath in filepaths:
+            name = os.path.basename(fpath)
+            try:
+                with stage("stream", file=name, bytes_read=os.path.getsize(fpath)) as record:
+                    written = writer.fh.tell()
+                    triangles = vertices = chunks = 0
+                    for chunk in iter_mesh_chunks(fpath, chunk_bytes, linear_deflection, angular_deflection,
+                                                  step_select):
+                        if drop_degenerate:
+                            chunk = select_faces(chunk, ~degenerate_faces(chunk))
+                        writer.write(chunk, chunk.name or name)
+                        triangles += chunk.n_faces
+                        vertices += chunk.n_vertices
+                        chunks += 1
+                    record.update(triangles=triangles, vertices=vertices, chunks=chunks,
+                                  bytes_written=writer.fh.tell() - written)
+            except Exception as ex:
+                error = f"{type(ex).__name__}: {ex}"
+                print(f"Failed to load {fpath}: {error}")
+                failures.append((fpath, error))
+    return failures